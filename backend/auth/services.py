@@ -1,5 +1,8 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional
 
 # FastAPI
 from fastapi import Depends, HTTPException, status
@@ -9,16 +12,32 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
+from bson import ObjectId
 
 # Local
 from auth.models import TokenData, UserInDB
+from cache import TTLCache
 from config import settings
 from db.mongo import get_database
+from metrics import AUTH_DURATION
 
 
 ph = PasswordHasher()
 security = HTTPBearer()
 
+# Argon2 runs in its own threads (it releases the GIL) so it never blocks the
+# event loop; beyond workers + queue size, new requests are rejected with 503
+hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="argon2"
+)
+hash_pending = 0
+rehash_tasks = set()
+
+# Users resolved by get_current_user, keyed by the raw token already verified
+user_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+
+admin_usernames = {u.strip() for u in settings.ADMIN_USERNAMES.split(",") if u.strip()}
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
@@ -34,24 +53,69 @@ def get_password_hash(password: str) -> str:
     return ph.hash(password)
 
 
-def get_user(username: str) -> Optional[UserInDB]:
+async def run_password_hasher(func: Callable, *args) -> Any:
+    global hash_pending
+
+    limit = settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE
+    if hash_pending >= limit:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio de autenticación saturado, inténtelo más tarde",
+            headers={"Retry-After": "1"},
+        )
+
+    hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(hash_executor, func, *args)
+    finally:
+        hash_pending -= 1
+
+
+async def save_rehashed_password(user: UserInDB, new_hash: str):
+    db = get_database()
+    await db.users.update_one(
+        {"_id": ObjectId(user.id), "hashed_password": user.hashed_password},
+        {"$set": {"hashed_password": new_hash}},
+    )
+    invalidate_user(user.username)
+
+
+async def get_user(username: str) -> Optional[UserInDB]:
     db = get_database()
-    user_dict = db.users.find_one({"username": username})
+    user_dict = await db.users.find_one({"username": username})
     if user_dict:
         user_dict["_id"] = str(user_dict["_id"])
         return UserInDB(**user_dict)
     return None
 
 
-def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
-    user = get_user(username)
+async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
+    user = await get_user(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+
+    valid = await run_password_hasher(verify_password, password, user.hashed_password)
+    if not valid:
         return None
+
+    if isinstance(valid, str):
+        # Parameters changed since this hash was made: store the new one
+        # without making the login wait for the write
+        task = asyncio.create_task(save_rehashed_password(user, valid))
+        rehash_tasks.add(task)
+        task.add_done_callback(rehash_tasks.discard)
     return user
 
 
+def invalidate_user(username: str):
+    """
+    Drops every cached token of `username`; call after creating or changing
+    a user.
+    """
+    user_cache.delete_where(lambda user: user.username == username)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -74,8 +138,14 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    start = time.perf_counter()
+    token = credentials.credentials
+    cached_user = user_cache.get(token)
+    if cached_user is not None:
+        AUTH_DURATION.observe(("cache",), time.perf_counter() - start)
+        return cached_user
+
     try:
-        token = credentials.credentials
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
@@ -86,7 +156,27 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = get_user(username=token_data.username)
+    user = await get_user(username=token_data.username)
     if user is None:
         raise credentials_exception
+
+    # Never serve a cached user past the token's own expiry
+    expires_in = payload["exp"] - time.time() if "exp" in payload else None
+    user_cache.set(token, user, ttl=expires_in)
+    AUTH_DURATION.observe(("token",), time.perf_counter() - start)
     return user
+
+
+def is_admin(user: UserInDB) -> bool:
+    return user.username in admin_usernames
+
+
+async def get_admin_user(
+    current_user: UserInDB = Depends(get_current_user),
+) -> UserInDB:
+    if not is_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requieren permisos de administrador",
+        )
+    return current_user
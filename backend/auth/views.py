@@ -3,6 +3,9 @@ from datetime import timedelta, datetime
 # FastAPI
 from fastapi import APIRouter, HTTPException, status, Depends, Form
 
+# Third Party
+from pymongo.errors import DuplicateKeyError
+
 
 # Local
 from auth.models import Token, UserCreate, User
@@ -12,6 +15,8 @@ from auth.services import (
     get_password_hash,
     get_current_user,
     get_user,
+    invalidate_user,
+    run_password_hasher,
 )
 from config import settings
 from db.mongo import get_database
@@ -30,21 +35,30 @@ class LoginRequestForm:
 async def register(user: UserCreate):
     db = get_database()
 
-    existing_user = get_user(user.username)
+    existing_user = await get_user(user.username)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists",
         )
 
+    hashed_password = await run_password_hasher(get_password_hash, user.password)
     user_dict = {
         "username": user.username,
-        "hashed_password": get_password_hash(user.password),
+        "hashed_password": hashed_password,
         "created_at": datetime.utcnow(),
     }
 
-    result = db.users.insert_one(user_dict)
-    created_user = db.users.find_one({"_id": result.inserted_id})
+    try:
+        result = await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        # Lost a race against a concurrent registration of the same username
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already exists",
+        )
+    created_user = await db.users.find_one({"_id": result.inserted_id})
+    invalidate_user(user.username)
 
     return User(
         id=str(created_user["_id"]),
@@ -54,7 +68,7 @@ async def register(user: UserCreate):
 
 @router.post("/login", response_model=Token)
 async def login(form_data: LoginRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
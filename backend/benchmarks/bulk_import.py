@@ -0,0 +1,73 @@
+"""
+Bulk import throughput.
+
+Streams a synthetic NDJSON catalog through the importer and reports rows/s,
+next to the rate of one-by-one BookService.create_book calls.
+
+    python -m benchmarks.bulk_import --rows 200000 --batch-size 1000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import AsyncIterator
+
+# Local
+from benchmarks.dataset import synthetic_books
+from books.importer import import_books
+from books.models import BookCreate
+from books.services import BookService
+from db.mongo import close_mongo_connection, connect_to_mongo
+
+
+async def ndjson_chunks(rows: int, rows_per_chunk: int = 500) -> AsyncIterator[bytes]:
+    lines = []
+    for book in synthetic_books(rows, seed=7):
+        book = {**book, "published_date": book["published_date"].isoformat()}
+        del book["created_at"], book["updated_at"]
+        lines.append(json.dumps(book))
+        if len(lines) == rows_per_chunk:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield "\n".join(lines).encode()
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+
+    start = time.perf_counter()
+    report = await import_books(ndjson_chunks(args.rows), batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(
+        {
+            "mode": "bulk import",
+            "rows": report.received,
+            "inserted": report.inserted,
+            "rows_per_s": round(report.received / elapsed),
+        }
+    )
+
+    sample = [BookCreate(**book) for book in synthetic_books(args.single_rows, seed=8)]
+    start = time.perf_counter()
+    for book in sample:
+        await BookService.create_book(book)
+    elapsed = time.perf_counter() - start
+    print(
+        {
+            "mode": "create_book",
+            "rows": len(sample),
+            "rows_per_s": round(len(sample) / elapsed),
+        }
+    )
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--single-rows", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+"""
+Full catalog download vs incremental sync through the changes feed.
+
+Seeds the benchmark database with a synthetic catalog (if needed), times a
+full download with keyset pages of GET /books and an initial sync through
+the changes feed, then updates and deletes --churn books and times the
+incremental sync from the token the initial sync ended with.
+
+    DATABASE_NAME=books_bench python -m benchmarks.changes --books 200000 --churn 500
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+# Local
+from benchmarks.dataset import seed
+from books.changes import CHANGES_SORT
+from books.pagination import decode_cursor, encode_cursor
+from books.services import BookService
+from config import settings
+from db.indexes import ensure_indexes
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+async def full_download(page_size: int) -> int:
+    count, after = 0, None
+    while True:
+        books = await BookService.get_books(limit=page_size, after=after)
+        count += len(books)
+        if len(books) < page_size:
+            return count
+        after = decode_cursor(encode_cursor(books[-1]))
+
+
+async def sync(after, page_size: int):
+    count = 0
+    while True:
+        changes = await BookService.get_changes(after, page_size)
+        count += len(changes["items"]) + len(changes["deleted"])
+        if changes["next_token"]:
+            after = decode_cursor(changes["next_token"], CHANGES_SORT)
+        if not changes["has_more"]:
+            return count, after
+
+
+async def timed_ms(coro):
+    start = time.perf_counter()
+    result = await coro
+    return round((time.perf_counter() - start) * 1000, 1), result
+
+
+async def main(args: argparse.Namespace):
+    # measure the queries, not the safety lag
+    settings.BOOK_CHANGES_LAG_MS = 0
+    connect_to_mongo()
+    db = get_database()
+    await seed(db, args.books)
+    await ensure_indexes(db)
+
+    full_ms, full_count = await timed_ms(full_download(args.page_size))
+    print({"phase": "full download", "ms": full_ms, "books": full_count})
+
+    initial_ms, (initial_count, token) = await timed_ms(sync(None, args.page_size))
+    print({"phase": "initial sync", "ms": initial_ms, "changes": initial_count})
+
+    sample = [{"$sample": {"size": args.churn}}, {"$project": {"_id": 1}}]
+    ids = [book["_id"] async for book in await db.books.aggregate(sample)]
+    updated, deleted = ids[: len(ids) // 2], ids[len(ids) // 2 :]
+    await db.books.update_many(
+        {"_id": {"$in": updated}}, {"$set": {"updated_at": datetime.utcnow()}}
+    )
+    for book_id in deleted:
+        await BookService.delete_book(str(book_id))
+
+    delta_ms, (delta_count, _) = await timed_ms(sync(token, args.page_size))
+    print({"phase": "incremental sync", "ms": delta_ms, "changes": delta_count})
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--churn", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""
+Identical concurrent reads with and without single-flight coalescing.
+
+Seeds the benchmark database with a synthetic catalog (if needed) and fires
+--callers concurrent identical calls of a few hot BookService reads, first
+with BookReads.flight disabled and then enabled, reporting the wall time of
+the burst and how many queries actually reached MongoDB.
+
+    DATABASE_NAME=books_bench python -m benchmarks.coalescing --callers 200
+"""
+
+import argparse
+import asyncio
+import time
+
+# Local
+from benchmarks.dataset import seed
+from books.services import BookReads, BookService
+from db.indexes import ensure_indexes
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+READS = {
+    "list page 1": lambda: BookService.get_books(skip=0, limit=20),
+    "regex search": lambda: BookService.search_books("dragón", limit=20, mode="regex"),
+    "average price": lambda: BookService.get_average_price_by_year(1950),
+}
+
+
+async def burst(read, callers: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(read() for _ in range(callers)))
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+    db = get_database()
+    await seed(db, args.books)
+    await ensure_indexes(db)
+
+    flight = BookReads.flight
+    for name, read in READS.items():
+        await read()
+        flight.enabled = False
+        plain_ms = await burst(read, args.callers)
+
+        flight.enabled = True
+        flight.counts.clear()
+        coalesced_ms = await burst(read, args.callers)
+        counts = next(iter(flight.counts.values()))
+        print(
+            {
+                "read": name,
+                "callers": args.callers,
+                "plain_ms": plain_ms,
+                "coalesced_ms": coalesced_ms,
+                "queries": counts["executed"],
+            }
+        )
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--callers", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+Bandwidth and latency saved by conditional requests.
+
+Fetches a book and a list page repeatedly from a running server, first
+unconditionally and then revalidating with If-None-Match, and reports bytes
+transferred and latency percentiles for each case.
+
+    python -m benchmarks.conditional --base-url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+# Third Party
+import httpx
+
+# Local
+from benchmarks.concurrency import login
+from benchmarks.utils import percentile
+
+
+async def measure(
+    client: httpx.AsyncClient, path: str, count: int, etag: Optional[str]
+) -> dict:
+    headers: Dict[str, str] = {"If-None-Match": etag} if etag else {}
+    latencies: List[float] = []
+    transferred = 0
+    statuses = set()
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        transferred += len(response.content)
+        statuses.add(response.status_code)
+    return {
+        "path": path,
+        "conditional": bool(etag),
+        "statuses": sorted(statuses),
+        "body_bytes": transferred,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def main(args: argparse.Namespace):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        token = await login(client, args.username, args.password)
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        page = await client.get(f"/api/v1/books/?page_size={args.page_size}")
+        book_id = page.json()["items"][0]["_id"]
+
+        for path in (f"/api/v1/books/{book_id}", page.request.url.raw_path.decode()):
+            etag = (await client.get(path)).headers.get("ETag")
+            print(await measure(client, path, args.requests, None))
+            print(await measure(client, path, args.requests, etag))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""
+Synthetic catalog used by the benchmarks.
+
+seed() writes into the configured database and rebuilds its book_stats, so
+it only runs against a dedicated one with "bench" in DATABASE_NAME, e.g.
+
+    DATABASE_NAME=books_bench python -m benchmarks.pagination
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator
+
+# Third Party
+from pymongo.asynchronous.database import AsyncDatabase
+
+# Local
+from books.stats import rebuild_stats
+from books.totals import invalidate_cached_total
+from config import settings
+
+
+GENRES = [
+    "Ciencia Ficción",
+    "Historia",
+    "Finanzas",
+    "Misterio",
+    "Fantasía",
+    "Romance",
+    "Poesía",
+    "Biografía",
+]
+WORDS = (
+    "el la de los juegos hambre código corazón noche ciudad señor niña agua "
+    "fuego camino canción último reino sombra mar tiempo dragón jardín sueño"
+).split()
+FIRST_NAMES = ["Ana", "José", "María", "Íñigo", "Lucía", "Andrés", "Sofía", "Raúl"]
+LAST_NAMES = ["García", "Martínez", "López", "Núñez", "Pérez", "Gómez", "Muñoz"]
+
+
+def synthetic_books(count: int, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    start = datetime(1900, 1, 1)
+    now = datetime.utcnow()
+    for _ in range(count):
+        yield {
+            "title": " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize(),
+            "author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "published_date": start + timedelta(days=rng.randint(0, 45000)),
+            "genre": rng.choice(GENRES),
+            "price": round(rng.uniform(5, 80), 2),
+            "created_at": now,
+            "updated_at": now,
+        }
+
+
+async def seed_books(db: AsyncDatabase, count: int, batch_size: int = 10000) -> int:
+    """
+    Tops the books collection up to `count` documents.
+    """
+    missing = count - await db.books.estimated_document_count()
+    if missing <= 0:
+        return 0
+
+    batch = []
+    for book in synthetic_books(missing):
+        batch.append(book)
+        if len(batch) == batch_size:
+            await db.books.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.books.insert_many(batch, ordered=False)
+    return missing
+
+
+def check_benchmark_database():
+    if "bench" not in settings.DATABASE_NAME:
+        raise SystemExit(
+            f"Refusing to seed {settings.DATABASE_NAME!r}: set DATABASE_NAME to a "
+            "dedicated benchmark database (with 'bench' in its name)"
+        )
+
+
+async def seed(db: AsyncDatabase, count: int) -> int:
+    """
+    seed_books into a benchmark database. Its raw inserts bypass the stats
+    and totals maintained by the API, so both are rebuilt afterwards.
+    """
+    check_benchmark_database()
+    inserted = await seed_books(db, count)
+    if inserted:
+        await rebuild_stats(db)
+        invalidate_cached_total()
+    return inserted
@@ -0,0 +1,63 @@
+"""
+Export memory and throughput check.
+
+Seeds the benchmark database with a synthetic catalog (1M books by default),
+streams it through the exporter and samples the process RSS after every
+batch. Exits with status 1 if RSS grew by more than --max-rss-growth-mb
+during the export; tests/test_export.py checks the same without MongoDB.
+
+    DATABASE_NAME=books_bench python -m benchmarks.export --format csv
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Local
+from benchmarks.dataset import seed
+from books.exporter import export_books
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+
+async def main(args: argparse.Namespace) -> int:
+    connect_to_mongo()
+    await seed(get_database(), args.books)
+
+    baseline = peak = rss_mb()
+    rows = exported = 0
+    start = time.perf_counter()
+    async for chunk in export_books(args.format, batch_size=args.batch_size):
+        exported += len(chunk)
+        rows += chunk.count(b"\n")
+        peak = max(peak, rss_mb())
+    elapsed = time.perf_counter() - start
+    await close_mongo_connection()
+
+    growth = peak - baseline
+    print(
+        {
+            "rows": rows,
+            "mb_exported": round(exported / (1 << 20), 1),
+            "rows_per_s": round(rows / elapsed),
+            "rss_baseline_mb": round(baseline, 1),
+            "rss_growth_mb": round(growth, 1),
+        }
+    )
+    return 0 if growth <= args.max_rss_growth_mb else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,131 @@
+"""
+Latency of every supported list filter and sort shape.
+
+Seeds the benchmark database with a synthetic catalog (1M books by default),
+applies the index registry and, for each shape accepted by
+books.query.compile_query, times the first page, a deep keyset page (the
+cursor of the book at --depth) and the filtered count, and reports the keys
+and documents MongoDB examined for the first page. Two shapes the API
+rejects are run directly against MongoDB for comparison.
+
+    DATABASE_NAME=books_bench python -m benchmarks.filters --books 1000000
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Any, Dict
+
+# Local
+from benchmarks.dataset import GENRES, seed
+from benchmarks.utils import timed
+from books.pagination import SortSpec, decode_cursor, encode_cursor
+from books.query import compile_query
+from books.services import BookService
+from db.indexes import ensure_indexes
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+GENRE = GENRES[0]
+AUTHOR = "Ana García"
+
+SUPPORTED = {
+    "default order": {},
+    "price range": {"price_min": 20, "price_max": 25},
+    "date range, newest first": {
+        "published_from": datetime(1950, 1, 1),
+        "published_to": datetime(1960, 1, 1),
+        "sort": "-published_date",
+    },
+    "by title": {"sort": "title"},
+    "genre": {"genre": GENRE},
+    "genre, price range": {"genre": GENRE, "price_min": 20, "price_max": 25},
+    "genre, newest first": {"genre": GENRE, "sort": "-published_date"},
+    "genre, by title": {"genre": GENRE, "sort": "title"},
+    "author": {"author": AUTHOR},
+    "author and genre, by date": {
+        "author": AUTHOR,
+        "genre": GENRE,
+        "sort": "published_date",
+    },
+}
+
+# Rejected by compile_query; filter and sort as a client would want them
+REJECTED = {
+    "genre, price range, by title (rejected)": (
+        {"genre": GENRE, "price": {"$gte": 20, "$lte": 25}},
+        [("title", 1), ("_id", 1)],
+    ),
+    "author, by price (rejected)": (
+        {"author": AUTHOR},
+        [("price", 1), ("_id", 1)],
+    ),
+}
+
+
+async def examined(query: Dict[str, Any], sort: SortSpec, limit: int) -> dict:
+    command = {"find": "books", "filter": query, "sort": dict(sort), "limit": limit}
+    explain = await get_database().command(
+        "explain", command, verbosity="executionStats"
+    )
+    stats = explain["executionStats"]
+    return {
+        "keys_examined": stats["totalKeysExamined"],
+        "docs_examined": stats["totalDocsExamined"],
+    }
+
+
+async def measure(
+    name: str, query: Dict[str, Any], sort: SortSpec, args: argparse.Namespace
+) -> dict:
+    size = args.page_size
+    first_ms, _ = await timed(
+        lambda: BookService.get_books(limit=size, query=query, sort=sort), args.repeat
+    )
+
+    deep_ms = None
+    anchor = await BookService.get_books(
+        skip=args.depth, limit=1, query=query, sort=sort
+    )
+    if anchor:
+        after = decode_cursor(encode_cursor(anchor[0], sort), sort)
+        deep_ms, _ = await timed(
+            lambda: BookService.get_books(
+                limit=size, after=after, query=query, sort=sort
+            ),
+            args.repeat,
+        )
+
+    count_ms, total = await timed(lambda: BookService.count_books(query), args.repeat)
+    return {
+        "shape": name,
+        "first_page_ms": first_ms,
+        "deep_page_ms": deep_ms,
+        "count_ms": count_ms,
+        "total": total,
+        **await examined(query, sort, size),
+    }
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+    db = get_database()
+    await seed(db, args.books)
+    await ensure_indexes(db)
+
+    for name, params in SUPPORTED.items():
+        query, sort = compile_query(**params)
+        print(await measure(name, query, sort, args))
+    for name, (query, sort) in REJECTED.items():
+        print(await measure(name, query, sort, args))
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,83 @@
+"""
+Book-read latency during a login storm.
+
+Measures GET /books latency from a single client, first on an idle server and
+then while many concurrent clients keep logging in (Argon2 on every call).
+Run it against this revision and an older one to compare. With the rate
+limiter on, most storm logins get 429 from the login's token cost; start the
+server with RATE_LIMIT_ENABLED=false to measure the Argon2 pool itself.
+
+    python -m benchmarks.login_storm --base-url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+# Third Party
+import httpx
+
+# Local
+from benchmarks.concurrency import login
+from benchmarks.utils import percentile
+
+
+async def read_latencies(client: httpx.AsyncClient, path: str, count: int) -> dict:
+    latencies: List[float] = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+async def storm(base_url: str, username: str, password: str, stop: asyncio.Event):
+    statuses = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        while not stop.is_set():
+            response = await client.post(
+                "/api/v1/auth/login", data={"username": username, "password": password}
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return statuses
+
+
+async def main(args: argparse.Namespace):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as reader:
+        token = await login(reader, args.username, args.password)
+        reader.headers["Authorization"] = f"Bearer {token}"
+
+        print({"phase": "idle", **await read_latencies(reader, args.path, args.reads)})
+
+        stop = asyncio.Event()
+        attackers = [
+            asyncio.create_task(
+                storm(args.base_url, args.username, args.password, stop)
+            )
+            for _ in range(args.logins)
+        ]
+        await asyncio.sleep(1)
+        result = await read_latencies(reader, args.path, args.reads)
+        stop.set()
+
+        login_statuses = {}
+        for statuses in await asyncio.gather(*attackers):
+            for code, count in statuses.items():
+                login_statuses[code] = login_statuses.get(code, 0) + count
+        print({"phase": "login storm", **result, "login_statuses": login_statuses})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/api/v1/books/?page=1&page_size=10")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
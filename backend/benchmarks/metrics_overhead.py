@@ -0,0 +1,90 @@
+"""
+Overhead of MetricsMiddleware on the /health route.
+
+Serves the application's health_check from two otherwise identical FastAPI
+apps, one with the middleware, calling them in-process over ASGI (no server,
+no network), and reports microseconds per request.
+Exits with status 1 if the middleware adds more than --max-overhead-us.
+
+    python -m benchmarks.metrics_overhead --requests 20000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+# FastAPI
+from fastapi import FastAPI
+
+# Local
+from main import health_check
+from metrics import MetricsMiddleware
+
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/health",
+    "raw_path": b"/health",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [(b"host", b"localhost")],
+    "client": ("127.0.0.1", 50000),
+    "server": ("127.0.0.1", 8000),
+}
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def measure(asgi, count: int, rounds: int) -> float:
+    """
+    Best per-request time in microseconds over `rounds` runs of `count`.
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(count):
+            await asgi(dict(SCOPE), receive, send)
+        best = min(best, time.perf_counter() - start)
+    return best / count * 1e6
+
+
+async def main(args: argparse.Namespace) -> int:
+    bare, wrapped = FastAPI(), FastAPI()
+    for app in (bare, wrapped):
+        app.add_api_route("/health", health_check)
+    wrapped.add_middleware(MetricsMiddleware)
+    await measure(bare, 1000, 1)
+    await measure(wrapped, 1000, 1)
+
+    bare_us = await measure(bare, args.requests, args.rounds)
+    wrapped_us = await measure(wrapped, args.requests, args.rounds)
+    overhead = wrapped_us - bare_us
+    print(
+        {
+            "requests": args.requests,
+            "bare_us": round(bare_us, 2),
+            "with_metrics_us": round(wrapped_us, 2),
+            "overhead_us": round(overhead, 2),
+            "overhead_pct": round(overhead / bare_us * 100, 1),
+        }
+    )
+    return 0 if overhead <= args.max_overhead_us else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-overhead-us", type=float, default=20)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,51 @@
+"""
+Offset vs keyset pagination latency.
+
+Seeds the benchmark database with a synthetic catalog (if needed) and times
+BookService.get_books for page 1 and a deep page, once with skip/limit and
+once with a cursor pointing at the same position.
+
+    DATABASE_NAME=books_bench python -m benchmarks.pagination --page 10000
+"""
+
+import argparse
+import asyncio
+
+# Local
+from benchmarks.dataset import seed
+from benchmarks.utils import timed
+from books.pagination import decode_cursor, encode_cursor
+from books.services import BookService
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+    await seed(get_database(), args.books)
+
+    size = args.page_size
+    for page in (1, args.page):
+        skip = (page - 1) * size
+        offset_ms, _ = await timed(
+            lambda: BookService.get_books(skip=skip, limit=size), args.repeat
+        )
+
+        after = None
+        if skip:
+            previous = await BookService.get_books(skip=skip - 1, limit=1)
+            after = decode_cursor(encode_cursor(previous[0]))
+        keyset_ms, _ = await timed(
+            lambda: BookService.get_books(limit=size, after=after), args.repeat
+        )
+        print({"page": page, "offset_ms": offset_ms, "keyset_ms": keyset_ms})
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--page", type=int, default=10000)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,58 @@
+"""
+Regex vs text-index search latency.
+
+Seeds the benchmark database with a synthetic catalog (1M books by default),
+applies the index registry and times BookService.search_books plus the
+hit count for a few queries in both modes.
+
+    DATABASE_NAME=books_bench python -m benchmarks.search --books 1000000
+"""
+
+import argparse
+import asyncio
+
+# Local
+from benchmarks.dataset import seed
+from benchmarks.utils import timed
+from books.services import BookService
+from db.indexes import ensure_indexes
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+QUERIES = ["dragón", "juegos hambre", "García", "canciones del mar"]
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+    db = get_database()
+    await seed(db, args.books)
+    await ensure_indexes(db)
+
+    for query in QUERIES:
+        for mode in ("regex", "text"):
+            page_ms, _ = await timed(
+                lambda: BookService.search_books(query, limit=10, mode=mode),
+                args.repeat,
+            )
+            count_ms, hits = await timed(
+                lambda: BookService.count_search_results(query, mode=mode),
+                args.repeat,
+            )
+            print(
+                {
+                    "query": query,
+                    "mode": mode,
+                    "page_ms": page_ms,
+                    "count_ms": count_ms,
+                    "hits": hits,
+                }
+            )
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
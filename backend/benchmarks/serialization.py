@@ -0,0 +1,62 @@
+"""
+Serialization cost of a list page, without a database.
+
+Compares the previous path (BookInDB per row, then FastAPI's jsonable_encoder
+and json.dumps) with the TypeAdapter path used by the list and search
+endpoints, on pages of synthetic raw documents.
+
+    python -m benchmarks.serialization --page-size 100
+"""
+
+import argparse
+import json
+import timeit
+
+# Third Party
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+# Local
+from benchmarks.dataset import synthetic_books
+from books.serialization import get_fieldset, validate_documents
+from books.services import BookService
+
+
+def model_path(rows: list) -> bytes:
+    books = [BookService._book_helper(dict(row)) for row in rows]
+    body = {"items": books, "total": len(books), "page_size": len(books)}
+    return json.dumps(jsonable_encoder(body)).encode()
+
+
+def adapter_path(rows: list) -> bytes:
+    body = {
+        "items": validate_documents(rows),
+        "total": len(rows),
+        "total_mode": "cached",
+        "page": 1,
+        "page_size": len(rows),
+        "total_pages": 1,
+        "next_cursor": None,
+    }
+    return get_fieldset().page.dump_json(body, by_alias=True)
+
+
+def main(args: argparse.Namespace):
+    rows = [{"_id": ObjectId(), **book} for book in synthetic_books(args.page_size)]
+    for name, func in (("model", model_path), ("adapter", adapter_path)):
+        best = min(timeit.repeat(lambda: func(rows), number=args.number, repeat=5))
+        print(
+            {
+                "path": name,
+                "page_size": args.page_size,
+                "us_per_page": round(best / args.number * 1e6, 1),
+                "bytes": len(func(rows)),
+            }
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--number", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,121 @@
+"""
+Price analytics from the columnar snapshot vs MongoDB aggregations.
+
+Seeds the benchmark database with a synthetic catalog (if needed), builds
+the stats snapshot (reporting build time and memory) and times percentiles,
+a histogram and per-genre / per-decade breakdowns answered from it against
+the equivalent aggregation pipelines ($percentile needs MongoDB 7.0).
+
+    DATABASE_NAME=books_bench python -m benchmarks.snapshot --books 200000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import time
+
+# Local
+from benchmarks.dataset import seed
+from books.snapshot import (
+    price_breakdown,
+    price_histogram,
+    price_percentiles,
+    refresh_snapshot,
+)
+from db.indexes import ensure_indexes
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+PERCENTILES = [50, 90, 95, 99]
+GROUP_PRICES = {
+    "book_count": {"$sum": 1},
+    "average_price": {"$avg": "$price"},
+    "min_price": {"$min": "$price"},
+    "max_price": {"$max": "$price"},
+    "median_price": {"$median": {"input": "$price", "method": "approximate"}},
+}
+PIPELINES = {
+    "percentiles": [
+        {
+            "$group": {
+                "_id": None,
+                "p": {
+                    "$percentile": {
+                        "input": "$price",
+                        "p": [q / 100 for q in PERCENTILES],
+                        "method": "approximate",
+                    }
+                },
+            }
+        }
+    ],
+    "histogram": [
+        {"$bucketAuto": {"groupBy": "$price", "buckets": 20}},
+    ],
+    "by genre": [{"$group": {"_id": "$genre", **GROUP_PRICES}}],
+    "by decade": [
+        {
+            "$group": {
+                "_id": {
+                    "$multiply": [
+                        {"$floor": {"$divide": [{"$year": "$published_date"}, 10]}},
+                        10,
+                    ]
+                },
+                **GROUP_PRICES,
+            }
+        }
+    ],
+}
+
+
+def snapshot_queries(snapshot):
+    return {
+        "percentiles": lambda: price_percentiles(snapshot, PERCENTILES, {}),
+        "histogram": lambda: price_histogram(snapshot, 20, None, {}),
+        "by genre": lambda: price_breakdown(snapshot, "genre", 50, {}),
+        "by decade": lambda: price_breakdown(snapshot, "decade", 50, {}),
+    }
+
+
+async def aggregate_ms(db, pipeline, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await (await db.books.aggregate(pipeline)).to_list()
+    return round((time.perf_counter() - start) * 1000 / repeat, 2)
+
+
+def snapshot_ms(query, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query()
+    return round((time.perf_counter() - start) * 1000 / repeat, 3)
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+    db = get_database()
+    await seed(db, args.books)
+    await ensure_indexes(db)
+
+    snapshot = await refresh_snapshot(db)
+    print({"snapshot": snapshot.info()})
+
+    for name, query in snapshot_queries(snapshot).items():
+        print(
+            {
+                "query": name,
+                "snapshot_ms": snapshot_ms(query, args.repeat),
+                "aggregation_ms": await aggregate_ms(
+                    db, PIPELINES[name], max(1, args.repeat // 10)
+                ),
+            }
+        )
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
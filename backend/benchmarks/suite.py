@@ -0,0 +1,345 @@
+"""
+Mixed-workload benchmark of the whole API.
+
+Seeds the configured database (MONGODB_URL / DATABASE_NAME, e.g. the
+docker-compose mongod) with a synthetic catalog and rebuilds its book_stats,
+so DATABASE_NAME must be a dedicated one with "bench" in its name. Replays a
+weighted mix of operations (login, list pages, deep pages, cursors, get,
+batch-get, search, stats and CRUD) with concurrent workers, and writes
+requests/s and latency percentiles per operation as JSON. The same --seed
+replays the same mix against the same catalog.
+
+By default the app runs in-process over ASGI (no network); with --base-url
+the requests go to a running server, which must use the same database. All
+requests come from one user, so the rate limiter is turned off in-process
+unless --rate-limit is given; start a server with RATE_LIMIT_ENABLED=false.
+Books created by the CRUD operations are deleted at the end, so the catalog
+size is the same for every run.
+
+    DATABASE_NAME=books_bench python -m benchmarks.suite --output before.json
+    DATABASE_NAME=books_bench python -m benchmarks.suite --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Third Party
+import httpx
+
+# Local
+from benchmarks.concurrency import login
+from benchmarks.dataset import (
+    GENRES,
+    WORDS,
+    check_benchmark_database,
+    seed,
+    synthetic_books,
+)
+from benchmarks.utils import percentile
+from books.pagination import encode_cursor
+from config import settings
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+from main import app, lifespan
+
+
+API = "/api/v1/books"
+
+# operation -> relative weight in the mix
+WEIGHTS = {
+    "login": 1,
+    "list_first": 20,
+    "list_deep": 4,
+    "list_cursor": 6,
+    "get": 20,
+    "batch_get": 5,
+    "search_text": 10,
+    "search_regex": 2,
+    "stats_years": 3,
+    "stats_average": 3,
+    "create": 4,
+    "update": 3,
+    "delete": 2,
+}
+
+Plan = List[Tuple[str, Dict[str, Any]]]
+
+
+def make_plan(args: argparse.Namespace, ids: List[str]) -> Plan:
+    """
+    Operations and their parameters, drawn up front so that a given --seed
+    always produces the same sequence.
+    """
+    rng = random.Random(args.seed)
+    names = rng.choices(list(WEIGHTS), weights=list(WEIGHTS.values()), k=args.requests)
+    new_books = synthetic_books(args.requests, seed=args.seed)
+    deep_pages = max(1, args.books // args.page_size)
+    plan = []
+    for name in names:
+        params: Dict[str, Any] = {}
+        if name == "list_deep":
+            params["page"] = rng.randint(deep_pages // 2, deep_pages)
+        elif name == "list_cursor":
+            params["cursor"] = encode_cursor({"_id": rng.choice(ids)})
+        elif name == "get":
+            params["id"] = rng.choice(ids)
+        elif name == "batch_get":
+            params["ids"] = rng.sample(ids, min(20, len(ids)))
+        elif name.startswith("search"):
+            params["q"] = rng.choice(WORDS)
+        elif name == "stats_years":
+            params["start_year"] = rng.randint(1900, 1990)
+            params["genre"] = rng.choice(GENRES)
+        elif name == "stats_average":
+            params["year"] = rng.randint(1900, 2020)
+        elif name in ("create", "update"):
+            book = next(new_books)
+            params["book"] = {
+                "title": book["title"],
+                "author": book["author"],
+                "published_date": book["published_date"].isoformat(),
+                "genre": book["genre"],
+                "price": book["price"],
+            }
+        plan.append((name, params))
+    return plan
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.created: List[str] = []
+
+    async def run(self, name: str, params: Dict[str, Any]) -> Optional[httpx.Response]:
+        return await getattr(self, f"op_{name}")(**params)
+
+    async def op_login(self):
+        return await self.client.post(
+            "/api/v1/auth/login",
+            data={"username": self.args.username, "password": self.args.password},
+        )
+
+    async def op_list_first(self):
+        params = {"page_size": self.args.page_size}
+        return await self.client.get(f"{API}/", params=params)
+
+    async def op_list_deep(self, page: int):
+        params = {"page": page, "page_size": self.args.page_size}
+        return await self.client.get(f"{API}/", params=params)
+
+    async def op_list_cursor(self, cursor: str):
+        params = {"cursor": cursor, "page_size": self.args.page_size}
+        return await self.client.get(f"{API}/", params=params)
+
+    async def op_get(self, id: str):
+        return await self.client.get(f"{API}/{id}")
+
+    async def op_batch_get(self, ids: List[str]):
+        return await self.client.post(f"{API}/batch-get", json={"ids": ids})
+
+    async def op_search_text(self, q: str):
+        return await self.client.get(f"{API}/search", params={"q": q, "mode": "text"})
+
+    async def op_search_regex(self, q: str):
+        return await self.client.get(f"{API}/search", params={"q": q, "mode": "regex"})
+
+    async def op_stats_years(self, start_year: int, genre: str):
+        params = {"start_year": start_year, "end_year": start_year + 30, "genre": genre}
+        return await self.client.get(f"{API}/stats/years", params=params)
+
+    async def op_stats_average(self, year: int):
+        params = {"year": year}
+        return await self.client.get(f"{API}/stats/average-price", params=params)
+
+    async def op_create(self, book: Dict[str, Any]):
+        response = await self.client.post(f"{API}/", json=book)
+        if response.status_code == 201:
+            self.created.append(response.json()["_id"])
+        return response
+
+    async def op_update(self, book: Dict[str, Any]):
+        if not self.created:
+            return await self.op_create(book)
+        update = {"price": book["price"], "genre": book["genre"]}
+        return await self.client.put(f"{API}/{self.created[-1]}", json=update)
+
+    async def op_delete(self):
+        if not self.created:
+            return None
+        return await self.client.delete(f"{API}/{self.created.pop()}")
+
+    async def cleanup(self):
+        size = 100
+        for start in range(0, len(self.created), size):
+            ids = self.created[start : start + size]
+            await self.client.post(f"{API}/batch-delete", json={"ids": ids})
+        self.created = []
+
+
+async def replay(
+    workload: Workload, plan: Plan, concurrency: int
+) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    remaining = iter(plan)
+
+    async def worker():
+        for name, params in remaining:
+            start = time.perf_counter()
+            response = await workload.run(name, params)
+            if response is None:
+                continue
+            latencies[name].append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def summarize(
+    latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float
+) -> Dict[str, Dict[str, float]]:
+    report = {}
+    for name in sorted(latencies):
+        samples = latencies[name]
+        report[name] = {
+            "count": len(samples),
+            "errors": errors.get(name, 0),
+            "rps": round(len(samples) / elapsed, 1),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        }
+    return report
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]):
+    def delta(before: float, after: float) -> str:
+        return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+
+    print(f"{'operation':15} {'p50 ms':>20} {'p99 ms':>20} {'req/s':>20}")
+    for name, after in current["operations"].items():
+        before = baseline["operations"].get(name)
+        if not before:
+            continue
+        cells = [
+            f"{before[key]:.1f}>{after[key]:.1f} {delta(before[key], after[key])}"
+            for key in ("p50_ms", "p99_ms", "rps")
+        ]
+        print(f"{name:15} " + " ".join(f"{cell:>20}" for cell in cells))
+
+
+def git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+async def sample_ids(count: int) -> List[str]:
+    """
+    The first `count` ids in _id order, from which make_plan draws with the
+    seeded generator ($sample would give a different pool on every run).
+    """
+    cursor = get_database().books.find({}, {"_id": 1}).sort("_id").limit(count)
+    return [str(book["_id"]) async for book in cursor]
+
+
+async def benchmark(client: httpx.AsyncClient, args: argparse.Namespace) -> dict:
+    ids = await sample_ids(args.sample_ids)
+    token = await login(client, args.username, args.password)
+    client.headers["Authorization"] = f"Bearer {token}"
+
+    workload = Workload(client, args)
+    warmup_args = argparse.Namespace(**{**vars(args), "requests": args.warmup})
+    await replay(workload, make_plan(warmup_args, ids), args.concurrency)
+    latencies, errors, elapsed = await replay(
+        workload, make_plan(args, ids), args.concurrency
+    )
+    await workload.cleanup()
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "mode": "http" if args.base_url else "asgi",
+            "books": args.books,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "elapsed_s": round(elapsed, 2),
+            "rps": round(sum(map(len, latencies.values())) / elapsed, 1),
+        },
+        "operations": summarize(latencies, errors, elapsed),
+    }
+
+
+async def main(args: argparse.Namespace):
+    # before the lifespan runs migrations against it
+    check_benchmark_database()
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    if args.base_url:
+        connect_to_mongo()
+        # book_stats is read from MongoDB by the server; its cached total
+        # catches up within BOOK_TOTAL_CACHE_TTL
+        await seed(get_database(), args.books)
+        async with httpx.AsyncClient(
+            base_url=args.base_url, limits=limits, timeout=60
+        ) as client:
+            result = await benchmark(client, args)
+        await close_mongo_connection()
+    else:
+        settings.RATE_LIMIT_ENABLED = args.rate_limit
+        # lifespan connects to MongoDB, runs migrations and builds indexes
+        async with lifespan(app):
+            await seed(get_database(), args.books)
+            # report server errors as 500s, like over HTTP
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=60
+            ) as client:
+                result = await benchmark(client, args)
+
+    output = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(json.load(file), result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", help="Benchmark a running server instead")
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--sample-ids", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument(
+        "--rate-limit", action="store_true", help="Keep the rate limiter on"
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Compare against a previous report")
+    asyncio.run(main(parser.parse_args()))
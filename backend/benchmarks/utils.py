@@ -0,0 +1,24 @@
+import time
+from typing import Any, Awaitable, Callable, List, Tuple
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def timed(
+    coro_factory: Callable[[], Awaitable[Any]], repeat: int
+) -> Tuple[float, Any]:
+    """
+    Best-of-`repeat` wall time in milliseconds and the last result.
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await coro_factory()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2), result
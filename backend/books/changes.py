@@ -0,0 +1,87 @@
+"""
+Changes feed for incremental sync.
+
+Books are read in (updated_at, _id) order from a resumable token, together
+with the tombstones left by deletions in the same order, so a client that
+keeps its last token downloads only what changed since. Tombstones expire
+after BOOK_TOMBSTONE_RETENTION_DAYS (TTL index); older tokens get 410 and
+the client has to start over without a token.
+
+updated_at is assigned by the app just before each write, so a write still
+in flight can commit with an updated_at older than changes already served.
+The feed stops BOOK_CHANGES_LAG_MS short of the current time to leave room
+for those writes, and reads from the primary so replication lag cannot
+hide them either.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+# Third Party
+from pymongo import ASCENDING, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+
+# Local
+from books.pagination import encode_cursor, keyset_filter
+from books.serialization import BOOK_CHANGES, BookChanges
+from config import settings
+from db.mongo import get_database
+
+
+CHANGES_SORT = [("updated_at", ASCENDING), ("_id", ASCENDING)]
+
+
+async def record_deletions(db: AsyncDatabase, book_ids: Iterable[Any]):
+    """
+    Leaves a tombstone per deleted book. Upserts, so a book deleted twice
+    concurrently keeps a single tombstone.
+    """
+    now = datetime.utcnow()
+    requests = [
+        UpdateOne({"_id": book_id}, {"$set": {"updated_at": now}}, upsert=True)
+        for book_id in book_ids
+    ]
+    if requests:
+        await db.book_tombstones.bulk_write(requests, ordered=False)
+
+
+def token_expired(after: Dict[str, Any]) -> bool:
+    retention = timedelta(days=settings.BOOK_TOMBSTONE_RETENTION_DAYS)
+    return after["updated_at"] < datetime.utcnow() - retention
+
+
+async def get_changes(after: Optional[Dict[str, Any]], limit: int) -> BookChanges:
+    """
+    Up to `limit` changes after the token position `after` (from the start
+    when None), and the token of the last one.
+    """
+    db = get_database()
+    horizon = datetime.utcnow() - timedelta(milliseconds=settings.BOOK_CHANGES_LAG_MS)
+    query: Dict[str, Any] = {"updated_at": {"$lte": horizon}}
+    if after:
+        query = {"$and": [query, keyset_filter(after, CHANGES_SORT)]}
+
+    books = await db.books.find(query).sort(CHANGES_SORT).limit(limit + 1).to_list()
+    # without a token the client has nothing to delete yet
+    tombstones = []
+    if after:
+        cursor = db.book_tombstones.find(query).sort(CHANGES_SORT).limit(limit + 1)
+        tombstones = await cursor.to_list()
+
+    changes = sorted(
+        [(book, False) for book in books] + [(t, True) for t in tombstones],
+        key=lambda change: (change[0]["updated_at"], change[0]["_id"]),
+    )
+    page = changes[:limit]
+    return BOOK_CHANGES.validate_python(
+        {
+            "items": [row for row, deleted in page if not deleted],
+            "deleted": [
+                {"_id": row["_id"], "deleted_at": row["updated_at"]}
+                for row, deleted in page
+                if deleted
+            ],
+            "next_token": encode_cursor(page[-1][0], CHANGES_SORT) if page else None,
+            "has_more": len(changes) > limit,
+        }
+    )
@@ -0,0 +1,80 @@
+"""
+HTTP validators for book resources.
+
+A book's ETag is its id plus updated_at in milliseconds (the precision MongoDB
+stores), so an If-Match header can be turned back into an updated_at value
+and used as an atomic update filter. Lists get a weak ETag hashed from the
+items they contain.
+"""
+
+import calendar
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# Local
+from books.models import BookInDB
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _millis(value: datetime) -> int:
+    return calendar.timegm(value.utctimetuple()) * 1000 + value.microsecond // 1000
+
+
+def book_etag(book: BookInDB) -> str:
+    return f'"{book.id}-{_millis(book.updated_at)}"'
+
+
+def list_etag(books: Iterable[Dict[str, Any]], *extra) -> str:
+    digest = hashlib.sha1()
+    for book in books:
+        digest.update(f"{book['_id']}-{_millis(book['updated_at'])};".encode())
+    digest.update(repr(extra).encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def http_date(value: datetime) -> str:
+    seconds = EPOCH + timedelta(seconds=_millis(value) // 1000)
+    return format_datetime(seconds.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def _parse_tags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def none_match(if_none_match: str, etag: str) -> bool:
+    """
+    True when If-None-Match lists `etag` (weak comparison) or is "*".
+    """
+    opaque = etag.removeprefix("W/")
+    return any(
+        tag == "*" or tag.removeprefix("W/") == opaque
+        for tag in _parse_tags(if_none_match)
+    )
+
+
+def not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo:
+        since = since.replace(tzinfo=None) - since.utcoffset()
+    return _millis(last_modified) // 1000 <= _millis(since) // 1000
+
+
+def if_match_updated_at(if_match: str, book_id: str) -> Optional[datetime]:
+    """
+    Returns the updated_at encoded in the first strong ETag of `book_id`
+    found in an If-Match header, or None if there is none.
+    """
+    for tag in _parse_tags(if_match):
+        if tag.startswith("W/") or not (tag.startswith('"') and tag.endswith('"')):
+            continue
+        tag_id, _, millis = tag.strip('"').rpartition("-")
+        if tag_id == book_id and millis.isdigit():
+            return EPOCH + timedelta(milliseconds=int(millis))
+    return None
@@ -0,0 +1,207 @@
+"""
+Live feed of book changes.
+
+With a replica set (a single node is enough, see docker-compose.yml) every
+worker tails a MongoDB change stream on books, so it hears about writes made
+by any worker or directly in the database (mongo-express, scripts). Each
+change is handed to the listener given to start_book_events (cache
+invalidation) and broadcast to the clients of GET /books/events as
+Server-Sent Events.
+
+Without change streams (standalone mongod, or BOOK_CHANGE_STREAM_ENABLED
+off) the services publish their own writes instead: clients of the same
+worker still get them, but other workers' caches only catch up through
+their TTL.
+
+Events are {"op": "insert" | "update" | "replace" | "delete", "_id", "at"},
+or {"op": "reset", "at"} when changes may have been missed (change stream
+restarted, bulk import, a client too slow to keep up): caches are cleared
+and clients should catch up through /books/changes.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+# Third Party
+from pydantic_core import to_json
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Local
+from config import settings
+
+
+# Only what the listeners need; the full document is never sent
+CHANGE_PIPELINE = [{"$project": {"operationType": 1, "documentKey": 1}}]
+BOOK_OPERATIONS = {"insert", "update", "replace", "delete"}
+CHANGE_STREAM_HISTORY_LOST = 286
+
+Event = Dict[str, Any]
+Listener = Callable[[Event], Awaitable[None]]
+
+
+class BookEvents:
+    # "change_stream" or "local"
+    mode: str = "local"
+    listener: Optional[Listener] = None
+    task: Optional[asyncio.Task] = None
+    subscribers: Set[asyncio.Queue] = set()
+    published: int = 0
+    dropped: int = 0
+
+
+def _event(op: str, book_id: Any = None) -> Event:
+    event = {"op": op, "at": datetime.utcnow()}
+    if book_id is not None:
+        event["_id"] = str(book_id)
+    return event
+
+
+def _broadcast(event: Event):
+    BookEvents.published += 1
+    for queue in list(BookEvents.subscribers):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # the stream ends with a reset once the queue is drained
+            BookEvents.subscribers.discard(queue)
+            BookEvents.dropped += 1
+
+
+def publish(op: str, *book_ids: Any):
+    """
+    Broadcasts a write of this worker when no change stream will deliver it.
+    """
+    if BookEvents.mode != "local":
+        return
+    if not book_ids:
+        _broadcast(_event(op))
+    for book_id in book_ids:
+        _broadcast(_event(op, book_id))
+
+
+async def _dispatch(event: Event):
+    if BookEvents.listener:
+        try:
+            await BookEvents.listener(event)
+        except Exception as exc:
+            print(f"[events] Listener failed on {event}: {exc!r}")
+    _broadcast(event)
+
+
+async def _close(stream):
+    try:
+        await stream.close()
+    except PyMongoError:
+        pass
+
+
+async def _watch(db: AsyncDatabase, stream):
+    token = None
+    while True:
+        try:
+            if stream is None:
+                stream = await db.books.watch(CHANGE_PIPELINE, resume_after=token)
+                if token is None:
+                    # could not resume: whatever happened meanwhile is lost
+                    await _dispatch(_event("reset"))
+
+            async for change in stream:
+                token = change["_id"]
+                op = change["operationType"]
+                if op in BOOK_OPERATIONS:
+                    await _dispatch(_event(op, change["documentKey"]["_id"]))
+                else:
+                    # drop, rename or invalidate: this stream is over
+                    token = None
+                    await _dispatch(_event("reset"))
+            stream = None
+        except PyMongoError as exc:
+            print(f"[events] Change stream interrupted: {exc}")
+            if isinstance(exc, OperationFailure) and (
+                exc.code == CHANGE_STREAM_HISTORY_LOST
+            ):
+                token = None
+            if stream is not None:
+                await _close(stream)
+                stream = None
+            await asyncio.sleep(1)
+
+
+async def start_book_events(db: AsyncDatabase, listener: Listener):
+    """
+    Tails the books change stream when the deployment supports it, falling
+    back to publishing local writes only.
+    """
+    BookEvents.listener = listener
+    BookEvents.mode = "local"
+    if not settings.BOOK_CHANGE_STREAM_ENABLED:
+        return
+
+    try:
+        stream = await db.books.watch(CHANGE_PIPELINE)
+    except PyMongoError as exc:
+        print(f"[events] No change streams ({exc}), publishing local writes only")
+        return
+
+    BookEvents.mode = "change_stream"
+    BookEvents.task = asyncio.create_task(_watch(db, stream))
+    print("[events] Watching the books change stream")
+
+
+async def stop_book_events():
+    if BookEvents.task:
+        BookEvents.task.cancel()
+        try:
+            await BookEvents.task
+        except asyncio.CancelledError:
+            pass
+        BookEvents.task = None
+    for queue in list(BookEvents.subscribers):
+        try:
+            queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+    BookEvents.subscribers.clear()
+
+
+def _sse(event: Event) -> bytes:
+    return b"event: " + event["op"].encode() + b"\ndata: " + to_json(event) + b"\n\n"
+
+
+async def stream_events() -> AsyncIterator[bytes]:
+    """
+    Server-Sent Events for one client, with a comment line every
+    BOOK_EVENTS_KEEPALIVE_S so proxies keep the connection open.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.BOOK_EVENTS_QUEUE_SIZE)
+    BookEvents.subscribers.add(queue)
+    try:
+        yield f": {BookEvents.mode}\n\n".encode()
+        while True:
+            if queue.empty() and queue not in BookEvents.subscribers:
+                # dropped for falling behind
+                yield _sse(_event("reset"))
+                return
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), settings.BOOK_EVENTS_KEEPALIVE_S
+                )
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if event is None:
+                return
+            yield _sse(event)
+    finally:
+        BookEvents.subscribers.discard(queue)
+
+
+def events_stats() -> Dict[str, Any]:
+    return {
+        "mode": BookEvents.mode,
+        "subscribers": len(BookEvents.subscribers),
+        "published": BookEvents.published,
+        "dropped": BookEvents.dropped,
+    }
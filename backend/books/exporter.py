@@ -0,0 +1,111 @@
+"""
+Streaming export of the books collection as NDJSON or CSV.
+
+Documents go from the Mongo cursor to the output in batches of encoded bytes,
+without building Pydantic models, so memory stays flat whatever the size of
+the catalog.
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Third Party
+from bson import ObjectId
+from pydantic_core import to_json
+
+# Local
+from books.pagination import DEFAULT_SORT
+from db.mongo import get_read_database
+
+
+EXPORT_FIELDS = [
+    "_id",
+    "title",
+    "author",
+    "published_date",
+    "genre",
+    "price",
+    "created_at",
+    "updated_at",
+]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_batch(rows: List[Dict[str, Any]], fields: List[str]) -> bytes:
+    lines = [to_json({f: row.get(f) for f in fields}, fallback=_encode) for row in rows]
+    return b"\n".join(lines) + b"\n"
+
+
+def _csv_batch(rows: List[Dict[str, Any]], fields: List[str], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(fields)
+    writer.writerows([[_encode(row.get(f)) for f in fields] for row in rows])
+    return buffer.getvalue().encode()
+
+
+def export_filter(
+    genre: Optional[str] = None,
+    author: Optional[str] = None,
+    published_from: Optional[datetime] = None,
+    published_to: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if genre:
+        query["genre"] = genre
+    if author:
+        query["author"] = author
+    if published_from or published_to:
+        query["published_date"] = {}
+        if published_from:
+            query["published_date"]["$gte"] = published_from
+        if published_to:
+            query["published_date"]["$lte"] = published_to
+    return query
+
+
+async def export_books(
+    format: str = "ndjson",
+    fields: Optional[List[str]] = None,
+    query: Optional[Dict[str, Any]] = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[bytes]:
+    fields = fields or EXPORT_FIELDS
+    projection = {f: 1 for f in fields}
+    if "_id" not in fields:
+        projection["_id"] = 0
+
+    cursor = (
+        get_read_database()
+        .books.find(query or {}, projection)
+        .sort(DEFAULT_SORT)
+        .batch_size(batch_size)
+    )
+
+    def encode(rows: List[Dict[str, Any]]) -> bytes:
+        if format == "csv":
+            return _csv_batch(rows, fields, header=False)
+        return _ndjson_batch(rows, fields)
+
+    if format == "csv":
+        yield _csv_batch([], fields, header=True)
+
+    rows = []
+    async for row in cursor:
+        rows.append(row)
+        if len(rows) == batch_size:
+            yield encode(rows)
+            rows = []
+    if rows:
+        yield encode(rows)
@@ -0,0 +1,273 @@
+"""
+Streaming bulk import of books from NDJSON or CSV.
+
+Rows are parsed as the bytes arrive, validated with BookCreate and written in
+unordered insert_many batches, so memory use depends on the batch size and
+not on the size of the input. Used by POST /books/import and, for offline
+loads, from the command line:
+
+    python -m books.importer catalog.ndjson
+    python -m books.importer catalog.csv --format csv --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, List, Tuple, Union
+
+# Third Party
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+# Local
+from books.models import BookCreate, ImportReport, ImportRowError
+from books.stats import record_books_inserted
+from books.totals import adjust_cached_total
+from config import settings
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+FORMATS = ("ndjson", "csv")
+
+
+class RowError(Exception):
+    pass
+
+
+def _decode(line: bytes) -> str:
+    return line.decode("utf-8-sig", errors="replace").rstrip("\r")
+
+
+def _too_long() -> RowError:
+    limit = settings.BOOK_IMPORT_MAX_RECORD_BYTES
+    return RowError(f"Record longer than {limit} bytes")
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[Union[str, RowError]]:
+    """
+    Lines longer than BOOK_IMPORT_MAX_RECORD_BYTES are skipped up to the
+    next newline and yielded as a RowError, so a file without newlines
+    cannot grow the buffer without bound.
+    """
+    limit = settings.BOOK_IMPORT_MAX_RECORD_BYTES
+    buffer, skipping = b"", False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                # rest of the line already reported
+                skipping = False
+            elif len(line) > limit:
+                yield _too_long()
+            else:
+                yield _decode(line)
+        if len(buffer) > limit:
+            if not skipping:
+                yield _too_long()
+            buffer, skipping = b"", True
+    if buffer and not skipping:
+        yield _decode(buffer)
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple]:
+    row = 0
+    async for line in iter_lines(chunks):
+        if isinstance(line, RowError):
+            row += 1
+            yield row, line
+            continue
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError("expected a JSON object")
+            yield row, data
+        except ValueError as exc:
+            yield row, RowError(f"Invalid JSON: {exc}")
+
+
+def _ends_quoted(line: str, quoted: bool) -> bool:
+    """
+    Whether a quoted field is still open at the end of `line`, as the csv
+    module reads it: only a quote opening a field starts one, and "" inside
+    it is an escaped quote.
+    """
+    if '"' not in line:
+        return quoted
+    field_start = not quoted
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quoted:
+            if char == '"':
+                if line[i + 1 : i + 2] == '"':
+                    i += 1
+                else:
+                    quoted = False
+        elif char == '"' and field_start:
+            quoted = True
+        field_start = not quoted and char == ","
+        i += 1
+    return quoted
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple]:
+    """
+    The first record is the header. A record may span several lines when a
+    quoted field contains newlines, so lines are joined until quotes balance.
+    A quote still open after BOOK_IMPORT_MAX_RECORD_BYTES or at the end of
+    the input is reported as an error on its line, and parsing resumes with
+    the line after it.
+    """
+    limit = settings.BOOK_IMPORT_MAX_RECORD_BYTES
+    lines = iter_lines(chunks)
+    pending: Deque[Union[str, RowError, None]] = deque()
+    header, row = None, 0
+    record: List[str] = []
+    size, quoted = 0, False
+    while True:
+        line = pending.popleft() if pending else await anext(lines, None)
+        if record and (not isinstance(line, str) or size + len(line) > limit):
+            row += header is not None
+            yield row, RowError("Unclosed quoted field")
+            # the stray quote is on the record's first line: re-read the rest
+            pending.appendleft(line)
+            pending.extendleft(reversed(record[1:]))
+            record, size, quoted = [], 0, False
+            continue
+        if line is None:
+            return
+        if isinstance(line, RowError):
+            row += 1
+            yield row, line
+            continue
+
+        record.append(line)
+        size += len(line) + 1
+        quoted = _ends_quoted(line, quoted)
+        if quoted:
+            continue
+        text = "\n".join(record)
+        record, size = [], 0
+        if not text.strip():
+            continue
+
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as exc:
+            row += header is not None
+            yield row, RowError(f"Invalid CSV: {exc}")
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+
+        row += 1
+        if len(values) != len(header):
+            yield row, RowError(f"Expected {len(header)} columns, got {len(values)}")
+        else:
+            yield row, dict(zip(header, values))
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+class BookImporter:
+    def __init__(self, batch_size: int = settings.BOOK_IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self._batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    def _add_error(self, row: int, message: str):
+        self.report.failed += 1
+        if len(self.report.errors) < settings.BOOK_IMPORT_MAX_ERRORS:
+            self.report.errors.append(ImportRowError(row=row, error=message))
+        else:
+            self.report.errors_truncated = True
+
+    async def add(self, row: int, data: Any):
+        self.report.received += 1
+        if isinstance(data, RowError):
+            self._add_error(row, str(data))
+            return
+
+        try:
+            book = BookCreate.model_validate(data).model_dump()
+        except ValidationError as exc:
+            self._add_error(row, _validation_message(exc))
+            return
+
+        self._batch.append((row, book))
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+
+        now = datetime.utcnow()
+        documents = [
+            {**book, "created_at": now, "updated_at": now} for _, book in batch
+        ]
+
+        failed = set()
+        try:
+            await get_database().books.insert_many(documents, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                failed.add(error["index"])
+                self._add_error(batch[error["index"]][0], error["errmsg"])
+
+        inserted = [doc for i, doc in enumerate(documents) if i not in failed]
+        self.report.inserted += len(inserted)
+        adjust_cached_total(len(inserted))
+        await record_books_inserted(get_database(), inserted)
+
+
+async def import_books(
+    chunks: AsyncIterator[bytes],
+    format: str = "ndjson",
+    batch_size: int = settings.BOOK_IMPORT_BATCH_SIZE,
+) -> ImportReport:
+    rows = iter_csv_rows(chunks) if format == "csv" else iter_ndjson_rows(chunks)
+    importer = BookImporter(batch_size=batch_size)
+    async for row, data in rows:
+        await importer.add(row, data)
+    await importer.flush()
+    return importer.report
+
+
+async def read_file(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+    report = await import_books(read_file(args.path), args.format, args.batch_size)
+    print(report.model_dump_json(indent=2))
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import books from a file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.BOOK_IMPORT_BATCH_SIZE
+    )
+    asyncio.run(main(parser.parse_args()))
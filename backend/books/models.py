@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Union
 from bson.objectid import ObjectId
 
 # Third Party
@@ -47,7 +47,102 @@ class Book(BookInDB):
     pass
 
 
+class BookBatchGet(BaseModel):
+    ids: List[str] = Field(..., min_length=1, description="IDs de los libros")
+
+
+class BookBatchGetResponse(BaseModel):
+    items: List[Optional[Book]]
+    missing: List[str]
+
+
+class BookBatchUpdateItem(BookUpdate):
+    id: str = Field(..., description="ID del libro")
+
+
+class BookBatchUpdate(BaseModel):
+    items: List[BookBatchUpdateItem] = Field(..., min_length=1)
+
+
+class BookBatchDelete(BaseModel):
+    ids: List[str] = Field(..., min_length=1, description="IDs de los libros")
+
+
+class BatchItemResult(BaseModel):
+    id: str
+    status: int
+    detail: Optional[str] = None
+    book: Optional[Book] = None
+
+
+class BatchResult(BaseModel):
+    results: List[BatchItemResult]
+
+
 class AveragePriceResponse(BaseModel):
     year: int
     average_price: float
     book_count: int
+
+
+class PriceStats(BaseModel):
+    book_count: int
+    average_price: float
+    min_price: float
+    max_price: float
+
+
+class YearPriceStats(PriceStats):
+    year: int
+
+
+class GenrePriceStats(PriceStats):
+    genre: str
+
+
+class PricePercentiles(BaseModel):
+    book_count: int
+    percentiles: Dict[str, float]
+    snapshot_age_seconds: float
+
+
+class PriceHistogram(BaseModel):
+    book_count: int
+    edges: List[float]
+    counts: List[int]
+    snapshot_age_seconds: float
+
+
+class GroupPriceStats(PriceStats):
+    group: Union[int, str]
+    median_price: float
+
+
+class PriceBreakdown(BaseModel):
+    by: str
+    groups: List[GroupPriceStats]
+    snapshot_age_seconds: float
+
+
+class StatsSnapshotInfo(BaseModel):
+    built_at: datetime
+    checked_at: datetime
+    age_seconds: float
+    build_ms: float
+    book_count: int
+    genre_count: int
+    author_count: int
+    memory_bytes: int
+
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+    errors_truncated: bool = False
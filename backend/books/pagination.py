@@ -0,0 +1,75 @@
+import base64
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+# Third Party
+from bson import ObjectId, json_util
+from pymongo import ASCENDING
+
+
+SortSpec = List[Tuple[str, int]]
+
+DEFAULT_SORT: SortSpec = [("_id", ASCENDING)]
+
+# Type of the cursor value of each sort field; any other field is text
+DATE_FIELDS = {"published_date", "updated_at"}
+NUMBER_FIELDS = {"price"}
+
+
+def encode_cursor(book: Dict[str, Any], sort: SortSpec = DEFAULT_SORT) -> str:
+    """
+    Builds an opaque token from the sort key values of the last book in a page.
+    """
+    values = {}
+    for field, _ in sort:
+        values[field] = ObjectId(book["_id"]) if field == "_id" else book[field]
+    raw = json_util.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: SortSpec = DEFAULT_SORT) -> Dict[str, Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, dict) or set(values) != {f for f, _ in sort}:
+        raise ValueError("Invalid cursor")
+    # values end up in equality clauses of keyset_filter, so anything but a
+    # plain value of the field type (e.g. {"$ne": null}) would be an operator
+    for field, value in values.items():
+        values[field] = _check_value(field, value)
+    return values
+
+
+def _check_value(field: str, value: Any) -> Any:
+    if field == "_id":
+        valid = isinstance(value, ObjectId)
+    elif field in DATE_FIELDS:
+        valid = isinstance(value, datetime)
+        if valid and value.tzinfo is not None:
+            # stored dates are naive UTC
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    elif field in NUMBER_FIELDS:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    else:
+        valid = isinstance(value, str)
+    if not valid:
+        raise ValueError("Invalid cursor")
+    return value
+
+
+def keyset_filter(after: Dict[str, Any], sort: SortSpec = DEFAULT_SORT) -> Dict:
+    """
+    Returns the filter selecting documents strictly after `after` in `sort`
+    order, e.g. for [(a, 1), (_id, 1)]:
+    {"$or": [{a: {"$gt": va}}, {a: va, _id: {"$gt": vid}}]}
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: after[f] for f, _ in sort[:i]}
+        op = "$gt" if direction == ASCENDING else "$lt"
+        clause[field] = {op: after[field]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
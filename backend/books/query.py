@@ -0,0 +1,115 @@
+"""
+Filters and sort orders of the book list.
+
+compile_query() turns the list parameters into a MongoDB filter and sort,
+but only for the shapes in SHAPES: equality on genre and/or author, ordered
+by one field, with a range only on that same field. Each shape is answered
+by one compound index in equality, sort, range order (see db.indexes), so a
+page reads about as many index keys as it returns. Any other combination
+would have to read or sort a large part of the collection on every page and
+is rejected with a ValueError.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Literal, Optional, Tuple
+
+# Third Party
+from pymongo import ASCENDING, DESCENDING
+
+# Local
+from books.pagination import DEFAULT_SORT, SortSpec
+
+
+SortValue = Literal[
+    "price", "-price", "published_date", "-published_date", "title", "-title"
+]
+
+# (equality field, sort field) -> index that serves it. With both genre and
+# author the author index is used and genre is checked on its few entries.
+SHAPES: Dict[Tuple[Optional[str], str], str] = {
+    (None, "_id"): "_id_",
+    (None, "price"): "price_id",
+    (None, "published_date"): "published_date_id",
+    (None, "title"): "title_id",
+    ("genre", "_id"): "genre_id",
+    ("genre", "price"): "genre_price_id",
+    ("genre", "published_date"): "genre_published_date_id",
+    ("genre", "title"): "genre_title_id",
+    ("author", "_id"): "author_id",
+    ("author", "published_date"): "author_published_date_id",
+}
+
+FIELD_NAMES = {
+    "_id": "id",
+    "price": "precio",
+    "published_date": "fecha de publicación",
+    "title": "título",
+    "genre": "género",
+    "author": "autor",
+}
+
+
+def _range(low: Any, high: Any) -> Optional[Dict[str, Any]]:
+    bounds = {}
+    if low is not None:
+        bounds["$gte"] = low
+    if high is not None:
+        bounds["$lte"] = high
+    return bounds or None
+
+
+def compile_query(
+    genre: Optional[str] = None,
+    author: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    published_from: Optional[datetime] = None,
+    published_to: Optional[datetime] = None,
+    sort: Optional[SortValue] = None,
+) -> Tuple[Dict[str, Any], SortSpec]:
+    """
+    Returns the filter and sort of a list request. Without `sort`, a range
+    orders by its own field and no range keeps the default _id order.
+    """
+    ranges = {
+        field: bounds
+        for field, bounds in (
+            ("price", _range(price_min, price_max)),
+            ("published_date", _range(published_from, published_to)),
+        )
+        if bounds
+    }
+    if len(ranges) > 1:
+        raise ValueError("Solo se puede filtrar por un rango (precio o fecha)")
+
+    if sort is None:
+        field, direction = next(iter(ranges), "_id"), ASCENDING
+    else:
+        field = sort.lstrip("-")
+        direction = DESCENDING if sort.startswith("-") else ASCENDING
+
+    for range_field in ranges:
+        if range_field != field:
+            raise ValueError(
+                f"El rango de {FIELD_NAMES[range_field]} requiere ordenar por "
+                f"{range_field}"
+            )
+
+    equality = "author" if author else "genre" if genre else None
+    if (equality, field) not in SHAPES:
+        orders = [s for e, s in SHAPES if e == equality and s != "_id"]
+        raise ValueError(
+            f"Al filtrar por {FIELD_NAMES[equality]} solo se puede ordenar por "
+            + ", ".join(orders)
+        )
+
+    query: Dict[str, Any] = {}
+    if genre:
+        query["genre"] = genre
+    if author:
+        query["author"] = author
+    query.update(ranges)
+
+    if field == "_id":
+        return query, DEFAULT_SORT
+    return query, [(field, direction), ("_id", direction)]
@@ -0,0 +1,131 @@
+"""
+Fast serialization path for book lists.
+
+Raw cursor rows are validated in one call against a precompiled TypeAdapter
+of TypedDicts (no model instances) and encoded to JSON bytes by pydantic-core,
+instead of building a BookInDB per row and letting FastAPI re-validate and
+JSON-encode it.
+
+Sparse fieldsets (`fields=title,author`) get their own TypedDicts and
+adapters, built on first use and cached per field set.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Third Party
+from pydantic import BeforeValidator, TypeAdapter
+from typing_extensions import Annotated, TypedDict
+
+
+class BookDocument(TypedDict):
+    _id: Annotated[str, BeforeValidator(str)]
+    title: str
+    author: str
+    published_date: datetime
+    genre: str
+    price: float
+    created_at: datetime
+    updated_at: datetime
+
+
+class BookTombstone(TypedDict):
+    _id: Annotated[str, BeforeValidator(str)]
+    deleted_at: datetime
+
+
+class BookChanges(TypedDict):
+    items: List[BookDocument]
+    deleted: List[BookTombstone]
+    next_token: Optional[str]
+    has_more: bool
+
+
+BOOK_CHANGES = TypeAdapter(BookChanges)
+
+BOOK_FIELDS: Tuple[str, ...] = tuple(BookDocument.__annotations__)
+
+# Always fetched: _id for cursors and ETags, updated_at for ETags.
+REQUIRED_FIELDS = ("_id", "updated_at")
+
+
+def _page_type(document: type) -> type:
+    return TypedDict(
+        f"{document.__name__}Page",
+        {
+            "items": List[document],
+            "total": Optional[int],
+            "total_mode": str,
+            "page": Optional[int],
+            "page_size": int,
+            "total_pages": Optional[int],
+            "next_cursor": Optional[str],
+        },
+    )
+
+
+def _batch_type(document: type) -> type:
+    return TypedDict(
+        f"{document.__name__}Batch",
+        {"items": List[Optional[document]], "missing": List[str]},
+    )
+
+
+class Fieldset:
+    """
+    Projection and adapters for one set of book fields. `documents` validates
+    the fetched rows (which also carry REQUIRED_FIELDS), while `items` and
+    `page` serialize only the requested fields.
+    """
+
+    def __init__(self, fields: Tuple[str, ...]):
+        self.fields = fields
+        fetched = [f for f in BOOK_FIELDS if f in fields or f in REQUIRED_FIELDS]
+        self.projection = {field: 1 for field in fetched}
+
+        if fields == BOOK_FIELDS:
+            fetched_type = output_type = BookDocument
+        else:
+            suffix = "".join(f.strip("_").title().replace("_", "") for f in fields)
+            annotations = BookDocument.__annotations__
+            fetched_type = TypedDict(
+                f"BookFetched{suffix}", {f: annotations[f] for f in fetched}
+            )
+            output_type = TypedDict(
+                f"Book{suffix}", {f: annotations[f] for f in fields}
+            )
+
+        self.documents = TypeAdapter(List[fetched_type])
+        self.document = TypeAdapter(output_type)
+        self.items = TypeAdapter(List[output_type])
+        self.page = TypeAdapter(_page_type(output_type))
+        self.batch = TypeAdapter(_batch_type(output_type))
+
+
+@lru_cache(maxsize=256)
+def get_fieldset(fields: Optional[Tuple[str, ...]] = None) -> Fieldset:
+    return Fieldset(fields or BOOK_FIELDS)
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Normalizes a comma separated `fields` parameter into a tuple in document
+    order that always includes _id ("id" is accepted as an alias). Returns None
+    when no fields are given. Raises ValueError naming unknown fields.
+    """
+    if not value:
+        return None
+    requested = {f.strip() for f in value.split(",") if f.strip()}
+    requested = {"_id" if f == "id" else f for f in requested}
+    unknown = requested - set(BOOK_FIELDS)
+    if unknown:
+        raise ValueError(", ".join(sorted(unknown)))
+    requested.add("_id")
+    return tuple(f for f in BOOK_FIELDS if f in requested)
+
+
+def validate_documents(
+    rows: List[Dict[str, Any]], fields: Optional[Tuple[str, ...]] = None
+) -> List[BookDocument]:
+    return get_fieldset(fields).documents.validate_python(rows)
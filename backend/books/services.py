@@ -1,10 +1,131 @@
-from typing import List, Optional, Dict, Any
+import re
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from bson import ObjectId
 
+# Third Party
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+
 # Local
-from db.mongo import get_database
-from books.models import BookCreate, BookUpdate, BookInDB
+from cache import CacheBackend, MemoryCacheBackend, SingleFlight
+from config import settings
+from db.mongo import get_database, get_read_database
+from books.changes import get_changes, record_deletions
+from books.events import Event, publish, stream_events
+from books.exporter import export_books
+from books.importer import import_books
+from books.models import (
+    BookBatchUpdateItem,
+    BookCreate,
+    BookUpdate,
+    BookInDB,
+    ImportReport,
+)
+from books.pagination import DEFAULT_SORT, SortSpec, keyset_filter
+from books.serialization import (
+    BookChanges,
+    BookDocument,
+    get_fieldset,
+    validate_documents,
+)
+from books.snapshot import (
+    StatsSnapshot,
+    price_breakdown,
+    price_histogram,
+    price_percentiles,
+)
+from books.stats import (
+    BookStats,
+    aggregate_stats,
+    recompute_buckets,
+    record_book_change,
+    record_books_changed,
+    year_range,
+)
+from books.totals import (
+    adjust_cached_total,
+    get_cached_total,
+    invalidate_cached_total,
+    set_cached_total,
+)
+
+
+TEXT_SORT = [("score", {"$meta": "textScore"}), ("_id", 1)]
+
+
+class BookCache:
+    """
+    Read-through cache for get_book, keyed by book id. Assign another
+    CacheBackend (e.g. one shared by all workers) to `backend` at startup.
+
+    A miss reads the book and then fills the key, so a write (or change
+    event) landing in between would leave the old document cached for the
+    whole TTL. Every write bumps `generation` and records it for the keys
+    being fetched; a fetch only fills its key if that did not move since it
+    started.
+    """
+
+    backend: CacheBackend = MemoryCacheBackend(
+        maxsize=settings.BOOK_CACHE_SIZE, ttl=settings.BOOK_CACHE_TTL
+    )
+    generation: int = 0
+    # key -> fetches in flight, and the generation of their key's last write
+    fetches: Dict[str, int] = {}
+    written: Dict[str, int] = {}
+
+    @classmethod
+    def begin_fetch(cls, key: str) -> int:
+        cls.fetches[key] = cls.fetches.get(key, 0) + 1
+        return cls.generation
+
+    @classmethod
+    def end_fetch(cls, key: str, generation: int) -> bool:
+        """
+        Whether the key can be filled with what the fetch read.
+        """
+        fresh = cls.written.get(key, 0) <= generation
+        cls.fetches[key] -= 1
+        if not cls.fetches[key]:
+            del cls.fetches[key]
+            cls.written.pop(key, None)
+        return fresh
+
+    @classmethod
+    def wrote(cls, *keys: str):
+        """
+        Marks `keys` (every key when none are given) as written, so fetches
+        in flight for them do not fill the cache.
+        """
+        cls.generation += 1
+        for key in keys or list(cls.fetches):
+            if key in cls.fetches:
+                cls.written[key] = cls.generation
+
+    @classmethod
+    async def delete(cls, key: str):
+        cls.wrote(key)
+        await cls.backend.delete(key)
+
+    @classmethod
+    async def clear(cls):
+        cls.wrote()
+        await cls.backend.clear()
+
+
+class BookReads:
+    """
+    Single-flight group for the list, search and stats queries: identical
+    concurrent calls share one execution (and, with READ_MICROCACHE_MS, its
+    result for a moment). Writes call invalidate(), so a read that starts
+    after a write in this worker never joins a query that started before it.
+    """
+
+    flight = SingleFlight(
+        ttl=settings.READ_MICROCACHE_MS / 1000,
+        maxsize=settings.READ_MICROCACHE_SIZE,
+        enabled=settings.READ_COALESCING_ENABLED,
+    )
 
 
 class BookService:
@@ -14,83 +135,373 @@ class BookService:
         return BookInDB(**book)
 
     @staticmethod
-    def create_book(book: BookCreate) -> BookInDB:
+    async def _cache_book(book: BookInDB):
+        BookCache.wrote(book.id)
+        value = book.model_dump(mode="json", by_alias=True)
+        await BookCache.backend.set(book.id, value)
+
+    @staticmethod
+    async def create_book(book: BookCreate) -> BookInDB:
         db = get_database()
         book_dict = book.model_dump()
         book_dict["created_at"] = datetime.utcnow()
         book_dict["updated_at"] = datetime.utcnow()
 
-        result = db.books.insert_one(book_dict)
-        created_book = db.books.find_one({"_id": result.inserted_id})
-        return BookService._book_helper(created_book)
+        # insert_one sets book_dict["_id"]; no need to read the book back
+        await db.books.insert_one(book_dict)
+        BookReads.flight.invalidate()
+        publish("insert", book_dict["_id"])
+        adjust_cached_total(1)
+        await record_book_change(db, new=book_dict)
+        return BookService._book_helper(book_dict)
+
+    @staticmethod
+    async def import_books(
+        chunks: AsyncIterator[bytes], format: str, batch_size: int
+    ) -> ImportReport:
+        try:
+            return await import_books(chunks, format=format, batch_size=batch_size)
+        finally:
+            BookReads.flight.invalidate()
+            publish("reset")
+
+    @staticmethod
+    def export_books(
+        format: str, fields: List[str], query: Dict[str, Any], batch_size: int
+    ) -> AsyncIterator[bytes]:
+        return export_books(format, fields=fields, query=query, batch_size=batch_size)
+
+    @staticmethod
+    async def get_changes(after: Optional[Dict[str, Any]], limit: int) -> BookChanges:
+        return await get_changes(after, limit)
+
+    @staticmethod
+    def stream_events() -> AsyncIterator[bytes]:
+        return stream_events()
+
+    @staticmethod
+    async def apply_change(event: Event):
+        """
+        Listener of the change feed: forgets what this worker cached about a
+        book changed by any worker, or everything after a reset. Inserts and
+        deletes also drop the cached total, as other workers' writes never
+        adjust it.
+        """
+        if event["op"] == "reset":
+            await BookCache.clear()
+        elif event["op"] != "insert":
+            await BookCache.delete(event["_id"])
+        if event["op"] in ("insert", "delete", "reset"):
+            invalidate_cached_total()
+        BookReads.flight.invalidate()
 
     @staticmethod
-    def get_book(book_id: str) -> Optional[BookInDB]:
+    async def get_book(book_id: str) -> Optional[BookInDB]:
         db = get_database()
         if not ObjectId.is_valid(book_id):
             return None
 
-        book = db.books.find_one({"_id": ObjectId(book_id)})
+        key = str(ObjectId(book_id))
+        cached = await BookCache.backend.get(key)
+        if cached is not None:
+            return BookInDB(**cached)
+
+        generation = BookCache.begin_fetch(key)
+        try:
+            book = await db.books.find_one({"_id": ObjectId(book_id)})
+        finally:
+            fresh = BookCache.end_fetch(key, generation)
         if book:
-            return BookService._book_helper(book)
+            book = BookService._book_helper(book)
+            if fresh:
+                value = book.model_dump(mode="json", by_alias=True)
+                await BookCache.backend.set(key, value)
+            return book
         return None
 
     @staticmethod
-    def get_books(skip: int = 0, limit: int = 10) -> List[BookInDB]:
+    async def book_exists(book_id: str) -> bool:
+        """
+        Uncached check on the primary, for deciding between 404 and 412 after
+        a conditional write: the cache may still hold a book another worker
+        deleted.
+        """
+        if not ObjectId.is_valid(book_id):
+            return False
         db = get_database()
-        books = db.books.find().skip(skip).limit(limit)
-        return [BookService._book_helper(book) for book in books]
+        book = await db.books.find_one({"_id": ObjectId(book_id)}, {"_id": 1})
+        return book is not None
+
+    @staticmethod
+    def _book_key(book_id: str) -> Optional[str]:
+        return str(ObjectId(book_id)) if ObjectId.is_valid(book_id) else None
 
     @staticmethod
-    def get_total_books() -> int:
+    async def _find_by_ids(
+        db: AsyncDatabase,
+        book_ids: List[str],
+        projection: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Raw documents of `book_ids` keyed by normalized id, fetched with a
+        single $in query. Invalid ids are skipped.
+        """
+        object_ids = [ObjectId(i) for i in book_ids if ObjectId.is_valid(i)]
+        if not object_ids:
+            return {}
+        books = db.books.find({"_id": {"$in": object_ids}}, projection)
+        return {str(book["_id"]): book async for book in books}
+
+    @staticmethod
+    async def get_books_by_ids(
+        book_ids: List[str], fields: Optional[Tuple[str, ...]] = None
+    ) -> List[Optional[BookDocument]]:
+        """
+        Books in the order of `book_ids`, with None for unknown ids.
+        """
+        rows = await BookService._find_by_ids(
+            get_read_database(), book_ids, get_fieldset(fields).projection
+        )
+        books = validate_documents(list(rows.values()), fields)
+        found = {book["_id"]: book for book in books}
+        return [found.get(BookService._book_key(i)) for i in book_ids]
+
+    @staticmethod
+    @BookReads.flight.coalesce("get_books")
+    async def get_books(
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[Dict[str, Any]] = None,
+        fields: Optional[Tuple[str, ...]] = None,
+        query: Optional[Dict[str, Any]] = None,
+        sort: SortSpec = DEFAULT_SORT,
+    ) -> List[BookDocument]:
+        """
+        `query` and `sort` come from books.query.compile_query; `after` holds
+        the sort key values of the previous page's last book.
+        """
+        db = get_read_database()
+        query = query or {}
+        if after:
+            keyset = keyset_filter(after, sort)
+            query = {"$and": [query, keyset]} if query else keyset
+        projection = get_fieldset(fields).projection
+        books = db.books.find(query, projection).sort(sort)
+        if not after:
+            books = books.skip(skip)
+        books = books.limit(limit)
+        return validate_documents(await books.to_list(), fields)
+
+    @staticmethod
+    async def get_total_books(exact: bool = False) -> Tuple[int, str]:
+        """
+        Returns the number of books and how it was obtained: "cached" (exact
+        count kept up to date by create/delete), "estimated" (collection
+        metadata, no scan) or "exact" (count_documents, then cached).
+        """
+        cached = get_cached_total()
+        if cached is not None:
+            return cached, "cached"
+
         db = get_database()
-        return db.books.count_documents({})
+        if not exact:
+            return await db.books.estimated_document_count(), "estimated"
+
+        total = await db.books.count_documents({})
+        set_cached_total(total)
+        return total, "exact"
+
+    @staticmethod
+    @BookReads.flight.coalesce("count_books")
+    async def count_books(query: Dict[str, Any]) -> int:
+        db = get_read_database()
+        return await db.books.count_documents(query)
 
     @staticmethod
-    def update_book(book_id: str, book_update: BookUpdate) -> Optional[BookInDB]:
+    async def update_book(
+        book_id: str,
+        book_update: BookUpdate,
+        expected_updated_at: Optional[datetime] = None,
+    ) -> Optional[BookInDB]:
+        """
+        With `expected_updated_at`, only updates the book if it has not been
+        modified since (optimistic concurrency); returns None otherwise.
+        """
         db = get_database()
         if not ObjectId.is_valid(book_id):
             return None
 
+        query = {"_id": ObjectId(book_id)}
+        if expected_updated_at:
+            query["updated_at"] = expected_updated_at
+
         update_data = book_update.model_dump(exclude_unset=True)
 
         if not update_data:
-            return BookService.get_book(book_id)
+            book = await db.books.find_one(query)
+            return BookService._book_helper(book) if book else None
 
         update_data["updated_at"] = datetime.utcnow()
 
-        result = db.books.update_one({"_id": ObjectId(book_id)}, {"$set": update_data})
+        old_book = await db.books.find_one_and_update(
+            query,
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if not old_book:
+            return None
 
-        if result.modified_count == 1:
-            return BookService.get_book(book_id)
-        return None
+        BookReads.flight.invalidate()
+        publish("update", old_book["_id"])
+        new_book = {**old_book, **update_data}
+        await record_book_change(db, old=old_book, new=new_book)
+        book = BookService._book_helper(new_book)
+        await BookService._cache_book(book)
+        return book
 
     @staticmethod
-    def delete_book(book_id: str) -> bool:
+    async def update_books(items: List[BookBatchUpdateItem]) -> List[Dict[str, Any]]:
+        """
+        Applies several updates with one read and one bulk_write. Each write
+        is conditional on the updated_at that was read, so books modified in
+        between are reported as 409 instead of being overwritten.
+        """
+        db = get_database()
+        old_books = await BookService._find_by_ids(db, [item.id for item in items])
+        now = datetime.utcnow()
+        # MongoDB stores milliseconds; lets us recognize our own writes below
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+        results, requests, pending = [], [], {}
+        for item in items:
+            result = {"id": item.id, "status": 200}
+            results.append(result)
+            key = BookService._book_key(item.id)
+            old_book = old_books.get(key)
+            if old_book is None:
+                result.update(status=404, detail="Libro no encontrado")
+                continue
+
+            update_data = item.model_dump(exclude_unset=True, exclude={"id"})
+            if not update_data:
+                result["book"] = BookService._book_helper(dict(old_book))
+                continue
+
+            update_data["updated_at"] = now
+            requests.append(
+                UpdateOne(
+                    {"_id": old_book["_id"], "updated_at": old_book["updated_at"]},
+                    {"$set": update_data},
+                )
+            )
+            pending[key] = (result, {**old_book, **update_data})
+
+        if not requests:
+            return results
+
+        write = await db.books.bulk_write(requests, ordered=False)
+        BookReads.flight.invalidate()
+        applied = set(pending)
+        if write.matched_count < len(requests):
+            current = await BookService._find_by_ids(
+                db, list(pending), {"updated_at": 1}
+            )
+            applied = {k for k, book in current.items() if book["updated_at"] == now}
+        publish("update", *applied)
+
+        await record_books_changed(
+            db, [(old_books[key], pending[key][1]) for key in applied]
+        )
+        for key, (result, new_book) in pending.items():
+            if key in applied:
+                result["book"] = BookService._book_helper(dict(new_book))
+                await BookService._cache_book(result["book"])
+            else:
+                result.update(status=409, detail="El libro ha sido modificado")
+                await BookCache.delete(key)
+        return results
+
+    @staticmethod
+    async def delete_book(
+        book_id: str, expected_updated_at: Optional[datetime] = None
+    ) -> bool:
         db = get_database()
         if not ObjectId.is_valid(book_id):
             return False
 
-        result = db.books.delete_one({"_id": ObjectId(book_id)})
-        return result.deleted_count == 1
+        query = {"_id": ObjectId(book_id)}
+        if expected_updated_at:
+            query["updated_at"] = expected_updated_at
+
+        deleted_book = await db.books.find_one_and_delete(query)
+        await BookCache.delete(str(ObjectId(book_id)))
+        if not deleted_book:
+            return False
+
+        BookReads.flight.invalidate()
+        publish("delete", deleted_book["_id"])
+        adjust_cached_total(-1)
+        await record_deletions(db, [deleted_book["_id"]])
+        await record_book_change(db, old=deleted_book)
+        return True
 
     @staticmethod
-    def get_average_price_by_year(year: int) -> Dict[str, Any]:
+    async def delete_books(book_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Deletes several books with one read and one delete_many.
+        """
         db = get_database()
+        old_books = await BookService._find_by_ids(db, book_ids)
+        for key in old_books:
+            await BookCache.delete(key)
+
+        if old_books:
+            ids = [book["_id"] for book in old_books.values()]
+            deleted = await db.books.delete_many({"_id": {"$in": ids}})
+            BookReads.flight.invalidate()
+            publish("delete", *ids)
+            adjust_cached_total(-deleted.deleted_count)
+            # those deleted concurrently get the same (upserted) tombstone
+            await record_deletions(db, ids)
+            if deleted.deleted_count == len(old_books):
+                await record_books_changed(
+                    db, [(book, None) for book in old_books.values()]
+                )
+            else:
+                # some were deleted concurrently (and already accounted for)
+                await recompute_buckets(db, list(old_books.values()))
 
-        pipeline = [
-            {"$addFields": {"published_year": {"$year": "$published_date"}}},
-            {"$match": {"published_year": year}},
-            {
-                "$group": {
-                    "_id": "$published_year",
-                    "average_price": {"$avg": "$price"},
-                    "book_count": {"$sum": 1},
-                }
-            },
-        ]
+        results = []
+        for book_id in book_ids:
+            if BookService._book_key(book_id) in old_books:
+                results.append({"id": book_id, "status": 204})
+            else:
+                results.append(
+                    {"id": book_id, "status": 404, "detail": "Libro no encontrado"}
+                )
+        return results
 
-        result = list(db.books.aggregate(pipeline))
+    @staticmethod
+    @BookReads.flight.coalesce("average_price_by_year")
+    async def get_average_price_by_year(year: int) -> Dict[str, Any]:
+        db = get_read_database()
+
+        if BookStats.ready:
+            result = await aggregate_stats(db, "year", {"year": year})
+        else:
+            # book_stats not built yet: date range scan on published_date_id
+            pipeline = [
+                {"$match": {"published_date": year_range(year)}},
+                {
+                    "$group": {
+                        "_id": None,
+                        "average_price": {"$avg": "$price"},
+                        "book_count": {"$sum": 1},
+                    }
+                },
+            ]
+            cursor = await db.books.aggregate(pipeline)
+            result = await cursor.to_list()
 
         if result:
             return {
@@ -102,15 +513,104 @@ class BookService:
             return {"year": year, "average_price": 0.0, "book_count": 0}
 
     @staticmethod
-    def search_books(query: str, skip: int = 0, limit: int = 10) -> List[BookInDB]:
-        db = get_database()
+    @BookReads.flight.coalesce("price_stats_by_year")
+    async def get_price_stats_by_year(
+        start_year: int, end_year: int, genre: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        match = {"year": {"$gte": start_year, "$lte": end_year}}
+        if genre:
+            match["genre"] = genre
+        return await aggregate_stats(get_read_database(), "year", match)
 
-        search_filter = {
+    @staticmethod
+    @BookReads.flight.coalesce("price_stats_by_genre")
+    async def get_price_stats_by_genre(
+        year: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        match = {"year": year} if year else {}
+        return await aggregate_stats(get_read_database(), "genre", match)
+
+    @staticmethod
+    def get_stats_snapshot_info() -> Optional[Dict[str, Any]]:
+        snapshot = StatsSnapshot.current
+        return snapshot.info() if snapshot else None
+
+    @staticmethod
+    def get_price_percentiles(
+        percentiles: List[float], filters: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        From the stats snapshot; None until it has been built.
+        """
+        snapshot = StatsSnapshot.current
+        return price_percentiles(snapshot, percentiles, filters) if snapshot else None
+
+    @staticmethod
+    def get_price_histogram(
+        bins: int,
+        price_range: Optional[Tuple[float, float]],
+        filters: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        snapshot = StatsSnapshot.current
+        if not snapshot:
+            return None
+        return price_histogram(snapshot, bins, price_range, filters)
+
+    @staticmethod
+    def get_price_breakdown(
+        by: str, limit: int, filters: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        snapshot = StatsSnapshot.current
+        return price_breakdown(snapshot, by, limit, filters) if snapshot else None
+
+    @staticmethod
+    def _search_filter(query: str, mode: str) -> Dict[str, Any]:
+        if mode == "text":
+            return {"$text": {"$search": query}}
+
+        pattern = re.escape(query)
+        return {
             "$or": [
-                {"title": {"$regex": query, "$options": "i"}},
-                {"author": {"$regex": query, "$options": "i"}},
+                {"title": {"$regex": pattern, "$options": "i"}},
+                {"author": {"$regex": pattern, "$options": "i"}},
             ]
         }
 
-        books = db.books.find(search_filter).skip(skip).limit(limit)
-        return [BookService._book_helper(book) for book in books]
+    @staticmethod
+    @BookReads.flight.coalesce("search_books")
+    async def search_books(
+        query: str,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[Dict[str, Any]] = None,
+        mode: str = "text",
+        fields: Optional[Tuple[str, ...]] = None,
+    ) -> List[BookDocument]:
+        """
+        Text mode ranks by relevance and pages with skip only: ordering all
+        its matches by _id has no index and would sort them in memory. Regex
+        mode walks the _id index, so it also takes keyset paging (`after`).
+        """
+        db = get_read_database()
+
+        search_filter = BookService._search_filter(query, mode)
+        if after:
+            search_filter = {"$and": [search_filter, keyset_filter(after)]}
+
+        projection = get_fieldset(fields).projection
+        if mode == "text":
+            projection = {**projection, "score": {"$meta": "textScore"}}
+            books = db.books.find(search_filter, projection).sort(TEXT_SORT)
+        else:
+            books = db.books.find(search_filter, projection).sort(DEFAULT_SORT)
+
+        if not after:
+            books = books.skip(skip)
+        books = books.limit(limit)
+        return validate_documents(await books.to_list(), fields)
+
+    @staticmethod
+    @BookReads.flight.coalesce("count_search_results")
+    async def count_search_results(query: str, mode: str = "text") -> int:
+        db = get_read_database()
+        return await db.books.count_documents(BookService._search_filter(query, mode))
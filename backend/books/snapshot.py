@@ -0,0 +1,320 @@
+"""
+In-memory columnar snapshot of the catalog for price analytics.
+
+Each worker keeps the price, publication year, genre and author of every
+book in NumPy arrays (genre and author as integer codes into category
+lists), sorted by price. Percentiles, histograms and group-bys are then
+vectorized operations over those arrays instead of aggregations over the
+books collection.
+
+The snapshot is checked every STATS_SNAPSHOT_REFRESH_S and rebuilt when the
+catalog version (book count and latest updated_at of books and tombstones)
+has changed. Answers are as old as the last check (snapshot_age_seconds);
+edits that bypass the API without touching updated_at or the count are only
+seen on restart.
+"""
+
+import asyncio
+import sys
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Third Party
+import numpy as np
+from pymongo import DESCENDING
+from pymongo.asynchronous.database import AsyncDatabase
+
+# Local
+from config import settings
+from db.mongo import get_read_database
+
+
+SNAPSHOT_FIELDS = ["price", "published_date", "genre", "author"]
+SNAPSHOT_PROJECTION = {"_id": 0, **{field: 1 for field in SNAPSHOT_FIELDS}}
+
+
+def _code_dtype(categories: Dict[str, int]) -> type:
+    # 16-bit keys get NumPy's radix sort in group-bys
+    return np.int16 if len(categories) <= np.iinfo(np.int16).max else np.int32
+
+
+class Snapshot:
+    def __init__(
+        self,
+        columns: Dict[str, array],
+        genres: Dict[str, int],
+        authors: Dict[str, int],
+        version: Tuple,
+        build_ms: float,
+    ):
+        order = np.argsort(np.asarray(columns["price"]), kind="stable")
+        self.price = np.asarray(columns["price"], dtype=np.float64)[order]
+        self.year = np.asarray(columns["year"], dtype=np.int16)[order]
+        self.genre = np.asarray(columns["genre"]).astype(_code_dtype(genres))[order]
+        self.author = np.asarray(columns["author"]).astype(_code_dtype(authors))[order]
+        # codes were assigned in insertion order, so position == code
+        self.genres = list(genres)
+        self.authors = list(authors)
+        self.codes = {"genre": genres, "author": authors}
+        self.version = version
+        self.build_ms = build_ms
+        self.built_at = self.checked_at = datetime.utcnow()
+
+    def age(self) -> float:
+        return round((datetime.utcnow() - self.checked_at).total_seconds(), 3)
+
+    def nbytes(self) -> int:
+        columns = self.price.nbytes + self.year.nbytes
+        columns += self.genre.nbytes + self.author.nbytes
+        categories = sum(sys.getsizeof(name) for name in self.genres + self.authors)
+        return columns + categories
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "built_at": self.built_at,
+            "checked_at": self.checked_at,
+            "age_seconds": self.age(),
+            "build_ms": self.build_ms,
+            "book_count": int(self.price.size),
+            "genre_count": len(self.genres),
+            "author_count": len(self.authors),
+            "memory_bytes": self.nbytes(),
+        }
+
+
+class StatsSnapshot:
+    current: Optional[Snapshot] = None
+    task: Optional[asyncio.Task] = None
+
+
+async def catalog_version(db: AsyncDatabase) -> Tuple:
+    """
+    Changes with every write through the API (deletions leave tombstones).
+    """
+    latest = []
+    for collection in (db.books, db.book_tombstones):
+        newest = await collection.find_one(
+            {}, {"updated_at": 1}, sort=[("updated_at", DESCENDING)]
+        )
+        latest.append(newest["updated_at"] if newest else None)
+    return (await db.books.estimated_document_count(), *latest)
+
+
+def _append_books(
+    columns: Dict[str, array],
+    genres: Dict[str, int],
+    authors: Dict[str, int],
+    books: List[Dict[str, Any]],
+) -> int:
+    """
+    Appends a batch of books to the columns and returns how many were
+    skipped for missing or mistyped fields (e.g. a string or Decimal128
+    price written outside the API).
+    """
+    skipped = 0
+    for book in books:
+        price, published_date = book.get("price"), book.get("published_date")
+        genre, author = book.get("genre", ""), book.get("author", "")
+        if (
+            not isinstance(price, (int, float))
+            or isinstance(price, bool)
+            or not isinstance(published_date, datetime)
+            or not isinstance(genre, str)
+            or not isinstance(author, str)
+        ):
+            skipped += 1
+            continue
+        columns["price"].append(price)
+        columns["year"].append(published_date.year)
+        columns["genre"].append(genres.setdefault(genre, len(genres)))
+        columns["author"].append(authors.setdefault(author, len(authors)))
+    return skipped
+
+
+async def build_snapshot(db: AsyncDatabase) -> Snapshot:
+    start = time.perf_counter()
+    version = await catalog_version(db)
+    # compact typed buffers while streaming, instead of lists of floats
+    columns = {"price": array("d"), "year": array("h")}
+    columns.update(genre=array("i"), author=array("i"))
+    genres: Dict[str, int] = {}
+    authors: Dict[str, int] = {}
+
+    # rows are converted and the arrays sorted in a thread, so a large
+    # catalog does not stall the event loop of the worker for the build
+    batch_size = settings.STATS_SNAPSHOT_BATCH_SIZE
+    cursor = db.books.find({}, SNAPSHOT_PROJECTION, batch_size=batch_size)
+    skipped = 0
+    while books := await cursor.to_list(batch_size):
+        skipped += await asyncio.to_thread(
+            _append_books, columns, genres, authors, books
+        )
+    if skipped:
+        print(f"[stats] Snapshot skipped {skipped} books with invalid fields")
+
+    build_ms = round((time.perf_counter() - start) * 1000, 1)
+    return await asyncio.to_thread(
+        Snapshot, columns, genres, authors, version, build_ms
+    )
+
+
+async def refresh_snapshot(db: AsyncDatabase) -> Snapshot:
+    current = StatsSnapshot.current
+    if current and current.version == await catalog_version(db):
+        current.checked_at = datetime.utcnow()
+        return current
+
+    StatsSnapshot.current = await build_snapshot(db)
+    info = StatsSnapshot.current.info()
+    print(
+        f"[stats] Snapshot of {info['book_count']} books built in "
+        f"{info['build_ms']} ms ({info['memory_bytes'] // 1024} KiB)"
+    )
+    return StatsSnapshot.current
+
+
+async def _refresh_loop():
+    while True:
+        try:
+            await refresh_snapshot(get_read_database())
+        except Exception as exc:
+            # keep refreshing: the next attempt may succeed
+            print(f"[stats] Snapshot refresh failed: {exc!r}")
+        await asyncio.sleep(settings.STATS_SNAPSHOT_REFRESH_S)
+
+
+def start_snapshot_refresher():
+    """
+    Builds the first snapshot in the background; until then the snapshot
+    endpoints answer 503.
+    """
+    if settings.STATS_SNAPSHOT_ENABLED:
+        StatsSnapshot.task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_snapshot_refresher():
+    if StatsSnapshot.task:
+        StatsSnapshot.task.cancel()
+        try:
+            await StatsSnapshot.task
+        except asyncio.CancelledError:
+            pass
+        StatsSnapshot.task = None
+
+
+def _prices(
+    snapshot: Snapshot,
+    genre: Optional[str] = None,
+    author: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+) -> Tuple[Any, np.ndarray]:
+    """
+    Selection of the books matching the filters, and their prices (still
+    sorted).
+    """
+    conditions = []
+    for field, value in (("genre", genre), ("author", author)):
+        if value is not None:
+            code = snapshot.codes[field].get(value, -1)
+            conditions.append(getattr(snapshot, field) == code)
+    if year_from is not None:
+        conditions.append(snapshot.year >= year_from)
+    if year_to is not None:
+        conditions.append(snapshot.year <= year_to)
+    if not conditions:
+        return slice(None), snapshot.price
+    mask = np.logical_and.reduce(conditions)
+    return mask, snapshot.price[mask]
+
+
+def price_percentiles(
+    snapshot: Snapshot, percentiles: List[float], filters: Dict[str, Any]
+) -> Dict[str, Any]:
+    _, prices = _prices(snapshot, **filters)
+    values = []
+    if prices.size:
+        # linear interpolation, as np.percentile, without re-sorting
+        rank = np.asarray(percentiles) / 100 * (prices.size - 1)
+        below, fraction = np.floor(rank).astype(int), rank % 1
+        above = np.minimum(below + 1, prices.size - 1)
+        values = prices[below] + (prices[above] - prices[below]) * fraction
+    return {
+        "book_count": int(prices.size),
+        "percentiles": {
+            f"p{q:g}": round(float(value), 2) for q, value in zip(percentiles, values)
+        },
+        "snapshot_age_seconds": snapshot.age(),
+    }
+
+
+def price_histogram(
+    snapshot: Snapshot,
+    bins: int,
+    price_range: Optional[Tuple[float, float]],
+    filters: Dict[str, Any],
+) -> Dict[str, Any]:
+    _, prices = _prices(snapshot, **filters)
+    counts, edges = [], []
+    if prices.size or price_range:
+        low, high = price_range or (prices[0], prices[-1])
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        # as np.histogram (last bin closed), by bisecting the sorted prices
+        edges = np.linspace(low, high, bins + 1)
+        positions = np.searchsorted(prices, edges)
+        positions[-1] = np.searchsorted(prices, high, side="right")
+        counts = np.diff(positions)
+    return {
+        "book_count": int(prices.size),
+        "edges": [round(float(edge), 2) for edge in edges],
+        "counts": [int(count) for count in counts],
+        "snapshot_age_seconds": snapshot.age(),
+    }
+
+
+def price_breakdown(
+    snapshot: Snapshot, by: str, limit: int, filters: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Price stats per group. Genres and authors come by book count (top
+    `limit`); years and decades in order.
+    """
+    mask, prices = _prices(snapshot, **filters)
+    if by in ("genre", "author"):
+        codes, names = getattr(snapshot, by)[mask], getattr(snapshot, f"{by}s")
+    else:
+        codes, names = snapshot.year[mask], None
+        if by == "decade":
+            codes = codes // 10 * 10
+
+    groups = []
+    if prices.size:
+        # stable sort by group keeps each group's prices sorted
+        order = np.argsort(codes, kind="stable")
+        codes, prices = codes[order], prices[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        counts = np.diff(np.r_[starts, codes.size])
+        sums = np.add.reduceat(prices, starts)
+        ends = starts + counts - 1
+        lower, upper = starts + (counts - 1) // 2, starts + counts // 2
+        medians = (prices[lower] + prices[upper]) / 2
+
+        selected = range(starts.size)
+        if names is not None:
+            selected = np.argsort(-counts, kind="stable")[:limit]
+        for i in selected:
+            code = int(codes[starts[i]])
+            groups.append(
+                {
+                    "group": names[code] if names is not None else code,
+                    "book_count": int(counts[i]),
+                    "average_price": round(float(sums[i] / counts[i]), 2),
+                    "min_price": float(prices[starts[i]]),
+                    "max_price": float(prices[ends[i]]),
+                    "median_price": round(float(medians[i]), 2),
+                }
+            )
+    return {"by": by, "groups": groups, "snapshot_age_seconds": snapshot.age()}
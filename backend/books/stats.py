@@ -0,0 +1,285 @@
+"""
+Materialized price statistics.
+
+book_stats holds one document per (year, genre) with the running sum, count,
+min and max of book prices. BookService keeps it up to date on every write;
+statistics endpoints read it instead of aggregating the books collection.
+Rebuild it from scratch (e.g. after editing books outside the API) with:
+
+    python -m books.stats --rebuild
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# Third Party
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+
+# Local
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+STATS_MIGRATION = "0002_book_stats"
+
+
+class BookStats:
+    ready: bool = False
+
+
+def year_range(year: int) -> Dict[str, datetime]:
+    return {"$gte": datetime(year, 1, 1), "$lt": datetime(year + 1, 1, 1)}
+
+
+def _bucket(book: Dict[str, Any]) -> Dict[str, Any]:
+    published = book["published_date"]
+    if published.tzinfo:
+        # MongoDB stores (and $year reads) dates in UTC
+        published = published.astimezone(timezone.utc)
+    return {"year": published.year, "genre": book["genre"]}
+
+
+async def _recompute_bucket(db: AsyncDatabase, bucket: Dict[str, Any]):
+    pipeline = [
+        {
+            "$match": {
+                "published_date": year_range(bucket["year"]),
+                "genre": bucket["genre"],
+            }
+        },
+        {
+            "$group": {
+                "_id": None,
+                "sum": {"$sum": "$price"},
+                "count": {"$sum": 1},
+                "min": {"$min": "$price"},
+                "max": {"$max": "$price"},
+            }
+        },
+    ]
+    cursor = await db.books.aggregate(pipeline)
+    result = await cursor.to_list()
+
+    if not result:
+        await db.book_stats.delete_one(bucket)
+        return
+    values = {k: result[0][k] for k in ("sum", "count", "min", "max")}
+    await db.book_stats.update_one(bucket, {"$set": values}, upsert=True)
+
+
+def _unchanged(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> bool:
+    return bool(
+        old and new and _bucket(old) == _bucket(new) and old["price"] == new["price"]
+    )
+
+
+async def record_book_change(
+    db: AsyncDatabase,
+    old: Optional[Dict[str, Any]] = None,
+    new: Optional[Dict[str, Any]] = None,
+):
+    """
+    Moves a book's price out of the bucket of `old` and into the bucket of
+    `new`; pass only `new` for inserts and only `old` for deletes.
+    """
+    if _unchanged(old, new):
+        return
+
+    if new:
+        price = new["price"]
+        await db.book_stats.update_one(
+            _bucket(new),
+            {
+                "$inc": {"sum": price, "count": 1},
+                "$min": {"min": price},
+                "$max": {"max": price},
+            },
+            upsert=True,
+        )
+
+    if old:
+        price = old["price"]
+        bucket = _bucket(old)
+        stats = await db.book_stats.find_one_and_update(
+            bucket,
+            {"$inc": {"sum": -price, "count": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        # min/max cannot be decremented: rescan the bucket when the removed
+        # price was one of them
+        if stats and (
+            stats["count"] <= 0 or price <= stats["min"] or price >= stats["max"]
+        ):
+            await _recompute_bucket(db, bucket)
+
+
+def _bucket_totals(books: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, float]]:
+    buckets: Dict[tuple, Dict[str, float]] = {}
+    for book in books:
+        price = book["price"]
+        key = tuple(_bucket(book).values())
+        totals = buckets.setdefault(
+            key, {"sum": 0, "count": 0, "min": price, "max": price}
+        )
+        totals["sum"] += price
+        totals["count"] += 1
+        totals["min"] = min(totals["min"], price)
+        totals["max"] = max(totals["max"], price)
+    return buckets
+
+
+async def record_books_inserted(db: AsyncDatabase, books: List[Dict[str, Any]]):
+    """
+    Bulk counterpart of record_book_change(new=...): one upsert per bucket.
+    """
+    await record_books_changed(db, [(None, book) for book in books])
+
+
+async def record_books_changed(
+    db: AsyncDatabase,
+    changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]],
+):
+    """
+    Bulk counterpart of record_book_change for (old, new) pairs: one write per
+    touched bucket, then a rescan of the buckets that lost their min or max.
+    """
+    changes = [(old, new) for old, new in changes if not _unchanged(old, new)]
+    added = _bucket_totals([new for _, new in changes if new])
+    removed = _bucket_totals([old for old, _ in changes if old])
+
+    requests = [
+        UpdateOne(
+            {"year": year, "genre": genre},
+            {
+                "$inc": {"sum": totals["sum"], "count": totals["count"]},
+                "$min": {"min": totals["min"]},
+                "$max": {"max": totals["max"]},
+            },
+            upsert=True,
+        )
+        for (year, genre), totals in added.items()
+    ]
+    requests += [
+        UpdateOne(
+            {"year": year, "genre": genre},
+            {"$inc": {"sum": -totals["sum"], "count": -totals["count"]}},
+        )
+        for (year, genre), totals in removed.items()
+    ]
+    if not requests:
+        return
+    await db.book_stats.bulk_write(requests, ordered=False)
+
+    if not removed:
+        return
+    buckets = [{"year": year, "genre": genre} for year, genre in removed]
+    async for stats in db.book_stats.find({"$or": buckets}):
+        bucket = {"year": stats["year"], "genre": stats["genre"]}
+        totals = removed[tuple(bucket.values())]
+        if (
+            stats["count"] <= 0
+            or totals["min"] <= stats["min"]
+            or totals["max"] >= stats["max"]
+        ):
+            await _recompute_bucket(db, bucket)
+
+
+async def recompute_buckets(db: AsyncDatabase, books: List[Dict[str, Any]]):
+    """
+    Rescans the buckets of `books` from the books collection.
+    """
+    for year, genre in _bucket_totals(books):
+        await _recompute_bucket(db, {"year": year, "genre": genre})
+
+
+async def rebuild_stats(db: AsyncDatabase):
+    pipeline = [
+        {
+            "$group": {
+                "_id": {"year": {"$year": "$published_date"}, "genre": "$genre"},
+                "sum": {"$sum": "$price"},
+                "count": {"$sum": 1},
+                "min": {"$min": "$price"},
+                "max": {"$max": "$price"},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "year": "$_id.year",
+                "genre": "$_id.genre",
+                "sum": 1,
+                "count": 1,
+                "min": 1,
+                "max": 1,
+            }
+        },
+        {"$out": "book_stats"},
+    ]
+    cursor = await db.books.aggregate(pipeline)
+    await cursor.to_list()
+
+    await db.migrations.update_one(
+        {"name": STATS_MIGRATION},
+        {"$set": {"name": STATS_MIGRATION, "executed_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    BookStats.ready = True
+
+
+async def ensure_stats(db: AsyncDatabase):
+    """
+    Builds book_stats the first time the app starts against a database.
+    """
+    if await db.migrations.find_one({"name": STATS_MIGRATION}):
+        BookStats.ready = True
+        return
+
+    print(f"[migration] Running {STATS_MIGRATION}...")
+    await rebuild_stats(db)
+    print(f"[migration] {STATS_MIGRATION} executed successfully")
+
+
+async def aggregate_stats(
+    db: AsyncDatabase, group_by: str, match: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    pipeline = [
+        {"$match": {**match, "count": {"$gt": 0}}},
+        {
+            "$group": {
+                "_id": f"${group_by}",
+                "sum": {"$sum": "$sum"},
+                "count": {"$sum": "$count"},
+                "min": {"$min": "$min"},
+                "max": {"$max": "$max"},
+            }
+        },
+        {"$sort": {"_id": 1}},
+    ]
+    cursor = await db.book_stats.aggregate(pipeline)
+    return [
+        {
+            group_by: row["_id"],
+            "book_count": row["count"],
+            "average_price": round(row["sum"] / row["count"], 2),
+            "min_price": row["min"],
+            "max_price": row["max"],
+        }
+        async for row in cursor
+    ]
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+    if args.rebuild:
+        await rebuild_stats(get_database())
+        print("[stats] book_stats rebuilt")
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the book_stats collection")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild from books")
+    asyncio.run(main(parser.parse_args()))
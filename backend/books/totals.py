@@ -0,0 +1,40 @@
+import time
+from typing import Optional
+
+# Local
+from config import settings
+
+
+class BookTotals:
+    """
+    Exact size of the books collection cached in-process. create_book and
+    delete_book adjust it in place; inserts and deletes of other workers
+    reach BookService.apply_change through the change feed and drop it, and
+    the TTL bounds drift when no feed delivers them.
+    """
+
+    value: Optional[int] = None
+    refreshed_at: float = 0.0
+
+
+def get_cached_total() -> Optional[int]:
+    if BookTotals.value is None:
+        return None
+    if time.monotonic() - BookTotals.refreshed_at > settings.BOOK_TOTAL_CACHE_TTL:
+        BookTotals.value = None
+        return None
+    return BookTotals.value
+
+
+def set_cached_total(total: int):
+    BookTotals.value = total
+    BookTotals.refreshed_at = time.monotonic()
+
+
+def adjust_cached_total(delta: int):
+    if BookTotals.value is not None:
+        BookTotals.value = max(0, BookTotals.value + delta)
+
+
+def invalidate_cached_total():
+    BookTotals.value = None
@@ -1,16 +1,148 @@
-from typing import List
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
 
 # FastAPI
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
 # Local
-from books.models import Book, BookCreate, BookUpdate, AveragePriceResponse
+from books.models import (
+    BatchResult,
+    Book,
+    BookBatchDelete,
+    BookBatchGet,
+    BookBatchGetResponse,
+    BookBatchUpdate,
+    BookCreate,
+    BookUpdate,
+    AveragePriceResponse,
+    GenrePriceStats,
+    ImportReport,
+    PriceBreakdown,
+    PriceHistogram,
+    PricePercentiles,
+    StatsSnapshotInfo,
+    YearPriceStats,
+)
+from books.changes import CHANGES_SORT, token_expired
+from books.conditional import (
+    book_etag,
+    http_date,
+    if_match_updated_at,
+    list_etag,
+    none_match,
+    not_modified_since,
+)
+from books.exporter import EXPORT_FIELDS, MEDIA_TYPES, export_filter
+from books.pagination import DEFAULT_SORT, SortSpec, decode_cursor, encode_cursor
+from books.query import SortValue, compile_query
+from books.serialization import (
+    BOOK_CHANGES,
+    BOOK_FIELDS,
+    get_fieldset,
+    parse_fields,
+)
 from books.services import BookService
 from auth.services import get_current_user
+from config import settings
 
 
 router = APIRouter(prefix="/books", tags=["books"])
 
+CURSOR_DESCRIPTION = (
+    "Paginación por cursor: vacío para la primera página, luego el valor de "
+    "next_cursor. Si se indica, se ignora page"
+)
+SORT_DESCRIPTION = (
+    "Orden: price, published_date o title, con - delante para descendente. "
+    "Un rango de precio o fecha solo se admite ordenando por ese campo (es el "
+    "orden por defecto si hay rango). Con author solo se admite published_date"
+)
+FIELDS_DESCRIPTION = (
+    "Campos a devolver separados por coma (siempre se incluye _id): "
+    + ", ".join(BOOK_FIELDS[1:])
+)
+
+
+def _decode_cursor(cursor: Optional[str], sort: SortSpec = DEFAULT_SORT):
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor, sort)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido",
+        )
+
+
+def _parse_fields(fields: Optional[str]):
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos desconocidos: {e}",
+        )
+
+
+def _check_batch(book_ids: List[str], unique: bool = True):
+    if len(book_ids) > settings.BOOK_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {settings.BOOK_BATCH_MAX_SIZE} libros por lote",
+        )
+    if unique and len({i.lower() for i in book_ids}) != len(book_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="IDs de libro duplicados en el lote",
+        )
+
+
+def _not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime] = None
+) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return none_match(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        return not_modified_since(if_modified_since, last_modified)
+    return False
+
+
+def _expected_updated_at(request: Request, book_id: str) -> Optional[datetime]:
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    updated_at = if_match_updated_at(if_match, book_id.lower())
+    if updated_at is None:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El libro ha sido modificado",
+        )
+    return updated_at
+
+
+async def _missing_or_modified(book_id: str, expected_updated_at: Optional[datetime]):
+    if expected_updated_at and await BookService.book_exists(book_id):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El libro ha sido modificado",
+        )
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Libro con ID {book_id} no encontrado",
+    )
+
+
+def _next_cursor(
+    books: List, page_size: int, sort: SortSpec = DEFAULT_SORT
+) -> Optional[str]:
+    if len(books) < page_size:
+        return None
+    return encode_cursor(books[-1], sort)
+
 
 @router.post(
     "/",
@@ -19,42 +151,281 @@ router = APIRouter(prefix="/books", tags=["books"])
     dependencies=[Depends(get_current_user)],
 )
 async def create_book(book: BookCreate):
-    created_book = BookService.create_book(book)
+    created_book = await BookService.create_book(book)
     return created_book
 
 
+@router.post(
+    "/import",
+    response_model=ImportReport,
+    dependencies=[Depends(get_current_user)],
+)
+async def import_books(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = Query(
+        None, description="Formato del cuerpo; por defecto según el Content-Type"
+    ),
+    batch_size: int = Query(
+        settings.BOOK_IMPORT_BATCH_SIZE, ge=1, le=10000, description="Filas por lote"
+    ),
+):
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    return await BookService.import_books(request.stream(), format, batch_size)
+
+
+@router.get("/export", dependencies=[Depends(get_current_user)])
+async def export_books(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Formato"),
+    fields: Optional[str] = Query(
+        None, description=f"Campos separados por coma: {', '.join(EXPORT_FIELDS)}"
+    ),
+    batch_size: int = Query(1000, ge=1, le=10000, description="Filas por lote"),
+    genre: Optional[str] = Query(None),
+    author: Optional[str] = Query(None),
+    published_from: Optional[datetime] = Query(None),
+    published_to: Optional[datetime] = Query(None),
+):
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else []
+    unknown = set(selected) - set(EXPORT_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos desconocidos: {', '.join(sorted(unknown))}",
+        )
+
+    query = export_filter(genre, author, published_from, published_to)
+    return StreamingResponse(
+        BookService.export_books(format, selected, query, batch_size),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'},
+    )
+
+
+@router.get("/changes", dependencies=[Depends(get_current_user)])
+async def get_book_changes(
+    since: Optional[str] = Query(
+        None,
+        description="next_token de la respuesta anterior; vacío para empezar "
+        "desde el principio (sin libros eliminados)",
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Cambios por página"),
+):
+    try:
+        # also checks that updated_at is a datetime and _id an ObjectId
+        after = decode_cursor(since, CHANGES_SORT) if since else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El token de sincronización es inválido",
+        )
+    if after and token_expired(after):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="El token de sincronización ha caducado, sincronice de nuevo "
+            "sin since",
+        )
+
+    changes = await BookService.get_changes(after, limit)
+    if changes["next_token"] is None:
+        # nothing new: keep the client where it was
+        changes["next_token"] = since or None
+    return Response(
+        content=BOOK_CHANGES.dump_json(changes), media_type="application/json"
+    )
+
+
+@router.get("/events", dependencies=[Depends(get_current_user)])
+async def book_events():
+    """
+    Server-Sent Events with each book insert, update and delete from now on.
+    There is no replay: after reconnecting or a `reset` event, catch up
+    with /books/changes.
+    """
+    return StreamingResponse(
+        BookService.stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/batch-get",
+    response_model=BookBatchGetResponse,
+    dependencies=[Depends(get_current_user)],
+)
+async def batch_get_books(
+    batch: BookBatchGet,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    _check_batch(batch.ids, unique=False)
+    selected = _parse_fields(fields)
+    books = await BookService.get_books_by_ids(batch.ids, fields=selected)
+    body = {
+        "items": books,
+        "missing": [i for i, book in zip(batch.ids, books) if book is None],
+    }
+    return Response(
+        content=get_fieldset(selected).batch.dump_json(body, by_alias=True),
+        media_type="application/json",
+    )
+
+
+@router.post(
+    "/batch-update",
+    response_model=BatchResult,
+    dependencies=[Depends(get_current_user)],
+)
+async def batch_update_books(batch: BookBatchUpdate):
+    _check_batch([item.id for item in batch.items])
+    return {"results": await BookService.update_books(batch.items)}
+
+
+@router.post(
+    "/batch-delete",
+    response_model=BatchResult,
+    dependencies=[Depends(get_current_user)],
+)
+async def batch_delete_books(batch: BookBatchDelete):
+    _check_batch(batch.ids)
+    return {"results": await BookService.delete_books(batch.ids)}
+
+
 @router.get("/", response_model=dict, dependencies=[Depends(get_current_user)])
 async def get_books(
+    request: Request,
     page: int = Query(1, ge=1, description="Número de página"),
     page_size: int = Query(
         10, ge=1, le=100, description="Cantidad de elementos por página"
     ),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    include_total: bool = Query(True, description="Calcular el total de libros"),
+    exact_total: bool = Query(
+        False, description="Contar exactamente si no hay un total en caché"
+    ),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    genre: Optional[str] = Query(None, description="Género exacto"),
+    author: Optional[str] = Query(None, description="Autor exacto"),
+    price_min: Optional[float] = Query(None, ge=0, description="Precio mínimo"),
+    price_max: Optional[float] = Query(None, ge=0, description="Precio máximo"),
+    published_from: Optional[datetime] = Query(None, description="Publicado desde"),
+    published_to: Optional[datetime] = Query(None, description="Publicado hasta"),
+    sort: Optional[SortValue] = Query(None, description=SORT_DESCRIPTION),
 ):
-    skip = (page - 1) * page_size
-    books = BookService.get_books(skip=skip, limit=page_size)
-    total = BookService.get_total_books()
-    total_pages = (total + page_size - 1) // page_size
+    try:
+        query, sort_spec = compile_query(
+            genre=genre,
+            author=author,
+            price_min=price_min,
+            price_max=price_max,
+            published_from=published_from,
+            published_to=published_to,
+            sort=sort,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    after = _decode_cursor(cursor, sort_spec)
+    selected = _parse_fields(fields)
+    sort_field = sort_spec[0][0]
+    if selected and sort_field not in selected:
+        # cursors are built from the sort key, so it is always returned
+        selected = tuple(f for f in BOOK_FIELDS if f in selected or f == sort_field)
+    skip = 0 if cursor is not None else (page - 1) * page_size
+    books = await BookService.get_books(
+        skip=skip,
+        limit=page_size,
+        after=after,
+        fields=selected,
+        query=query,
+        sort=sort_spec,
+    )
+
+    total, total_mode, total_pages = None, "none", None
+    if include_total and query:
+        total, total_mode = await BookService.count_books(query), "exact"
+    elif include_total:
+        total, total_mode = await BookService.get_total_books(exact=exact_total)
+    if total is not None:
+        total_pages = (total + page_size - 1) // page_size
 
-    return {
+    etag = list_etag(books, total, selected, query, sort_spec)
+    if _not_modified(request, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    body = {
         "items": books,
         "total": total,
-        "page": page,
+        "total_mode": total_mode,
+        "page": page if cursor is None else None,
         "page_size": page_size,
         "total_pages": total_pages,
+        "next_cursor": _next_cursor(books, page_size, sort_spec),
     }
+    return Response(
+        content=get_fieldset(selected).page.dump_json(body, by_alias=True),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
 
 
 @router.get(
     "/search", response_model=List[Book], dependencies=[Depends(get_current_user)]
 )
 async def search_books(
+    request: Request,
     q: str = Query(..., min_length=1, description="Término de búsqueda"),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(
+        None, description=f"{CURSOR_DESCRIPTION}. Solo en modo regex"
+    ),
+    mode: Literal["text", "regex"] = Query(
+        "text",
+        description="text: índice de texto completo ordenado por relevancia; "
+        "regex: coincidencia parcial en título y autor (lento)",
+    ),
+    include_total: bool = Query(True, description="Devolver X-Total-Count"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ):
-    skip = (page - 1) * page_size
-    books = BookService.search_books(query=q, skip=skip, limit=page_size)
-    return books
+    if cursor is not None and mode == "text":
+        # relevance-ordered pages cannot be resumed by _id, and ordering every
+        # text match by _id would sort them all in memory
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La paginación por cursor solo está disponible en modo regex",
+        )
+    after = _decode_cursor(cursor)
+    selected = _parse_fields(fields)
+    skip = 0 if cursor is not None else (page - 1) * page_size
+    books = await BookService.search_books(
+        query=q,
+        skip=skip,
+        limit=page_size,
+        after=after,
+        mode=mode,
+        fields=selected,
+    )
+    headers = {}
+    if mode == "regex":
+        next_cursor = _next_cursor(books, page_size)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+    if include_total:
+        total = await BookService.count_search_results(query=q, mode=mode)
+        headers["X-Total-Count"] = str(total)
+    headers["ETag"] = list_etag(books, headers.get("X-Total-Count"), selected)
+
+    if _not_modified(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=get_fieldset(selected).items.dump_json(books, by_alias=True),
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @router.get(
@@ -65,18 +436,160 @@ async def search_books(
 async def get_average_price_by_year(
     year: int = Query(..., ge=1000, le=9999, description="Año de publicación"),
 ):
-    result = BookService.get_average_price_by_year(year)
+    result = await BookService.get_average_price_by_year(year)
+    return result
+
+
+@router.get(
+    "/stats/years",
+    response_model=List[YearPriceStats],
+    dependencies=[Depends(get_current_user)],
+)
+async def get_price_stats_by_year(
+    start_year: int = Query(..., ge=1000, le=9999, description="Año inicial"),
+    end_year: int = Query(..., ge=1000, le=9999, description="Año final"),
+    genre: Optional[str] = Query(None, description="Filtrar por género"),
+):
+    if start_year > end_year:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_year no puede ser mayor que end_year",
+        )
+    return await BookService.get_price_stats_by_year(start_year, end_year, genre)
+
+
+@router.get(
+    "/stats/genres",
+    response_model=List[GenrePriceStats],
+    dependencies=[Depends(get_current_user)],
+)
+async def get_price_stats_by_genre(
+    year: Optional[int] = Query(None, ge=1000, le=9999, description="Año"),
+):
+    return await BookService.get_price_stats_by_genre(year)
+
+
+def snapshot_filters(
+    genre: Optional[str] = Query(None, description="Filtrar por género"),
+    author: Optional[str] = Query(None, description="Filtrar por autor"),
+    year_from: Optional[int] = Query(None, ge=1000, le=9999, description="Año inicial"),
+    year_to: Optional[int] = Query(None, ge=1000, le=9999, description="Año final"),
+) -> Dict[str, Any]:
+    if year_from and year_to and year_from > year_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="year_from no puede ser mayor que year_to",
+        )
+    return dict(genre=genre, author=author, year_from=year_from, year_to=year_to)
+
+
+def _from_snapshot(result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Las estadísticas aún no están disponibles, inténtelo más tarde",
+            headers={"Retry-After": "5"},
+        )
     return result
 
 
+@router.get(
+    "/stats/snapshot",
+    response_model=StatsSnapshotInfo,
+    dependencies=[Depends(get_current_user)],
+)
+async def get_stats_snapshot():
+    return _from_snapshot(BookService.get_stats_snapshot_info())
+
+
+@router.get(
+    "/stats/percentiles",
+    response_model=PricePercentiles,
+    dependencies=[Depends(get_current_user)],
+)
+async def get_price_percentiles(
+    percentiles: str = Query(
+        "50,90,95,99", description="Percentiles separados por coma (0-100)"
+    ),
+    filters: Dict[str, Any] = Depends(snapshot_filters),
+):
+    try:
+        values = [float(q) for q in percentiles.split(",") if q.strip()]
+    except ValueError:
+        values = []
+    if not 0 < len(values) <= 20 or not all(0 <= q <= 100 for q in values):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indique entre 1 y 20 percentiles entre 0 y 100",
+        )
+    return _from_snapshot(BookService.get_price_percentiles(values, filters))
+
+
+@router.get(
+    "/stats/histogram",
+    response_model=PriceHistogram,
+    dependencies=[Depends(get_current_user)],
+)
+async def get_price_histogram(
+    bins: int = Query(20, ge=1, le=200, description="Número de intervalos"),
+    price_min: Optional[float] = Query(None, ge=0, description="Precio mínimo"),
+    price_max: Optional[float] = Query(None, gt=0, description="Precio máximo"),
+    filters: Dict[str, Any] = Depends(snapshot_filters),
+):
+    price_range = None
+    if price_min is not None or price_max is not None:
+        if price_min is None or price_max is None or price_min >= price_max:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Indique price_min y price_max, con price_min menor",
+            )
+        price_range = (price_min, price_max)
+    return _from_snapshot(BookService.get_price_histogram(bins, price_range, filters))
+
+
+@router.get(
+    "/stats/breakdown",
+    response_model=PriceBreakdown,
+    dependencies=[Depends(get_current_user)],
+)
+async def get_price_breakdown(
+    by: Literal["genre", "author", "year", "decade"] = Query(
+        ..., description="Agrupar por"
+    ),
+    limit: int = Query(
+        50, ge=1, le=1000, description="Máximo de géneros o autores (los de más libros)"
+    ),
+    filters: Dict[str, Any] = Depends(snapshot_filters),
+):
+    return _from_snapshot(BookService.get_price_breakdown(by, limit, filters))
+
+
 @router.get("/{book_id}", response_model=Book, dependencies=[Depends(get_current_user)])
-async def get_book(book_id: str):
-    book = BookService.get_book(book_id)
+async def get_book(
+    book_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    selected = _parse_fields(fields)
+    book = await BookService.get_book(book_id)
     if not book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Libro con ID {book_id} no encontrado",
         )
+
+    headers = {"ETag": book_etag(book), "Last-Modified": http_date(book.updated_at)}
+    if _not_modified(request, headers["ETag"], book.updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if selected:
+        document = book.model_dump(by_alias=True)
+        return Response(
+            content=get_fieldset(selected).document.dump_json(document),
+            media_type="application/json",
+            headers=headers,
+        )
+    response.headers.update(headers)
     return book
 
 
@@ -84,13 +597,18 @@ async def get_book(book_id: str):
 async def update_book(
     book_id: str,
     book_update: BookUpdate,
+    request: Request,
+    response: Response,
 ):
-    updated_book = BookService.update_book(book_id, book_update)
+    expected_updated_at = _expected_updated_at(request, book_id)
+    updated_book = await BookService.update_book(
+        book_id, book_update, expected_updated_at=expected_updated_at
+    )
     if not updated_book:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Libro con ID {book_id} no encontrado",
-        )
+        await _missing_or_modified(book_id, expected_updated_at)
+
+    response.headers["ETag"] = book_etag(updated_book)
+    response.headers["Last-Modified"] = http_date(updated_book.updated_at)
     return updated_book
 
 
@@ -99,11 +617,11 @@ async def update_book(
     status_code=status.HTTP_204_NO_CONTENT,
     dependencies=[Depends(get_current_user)],
 )
-async def delete_book(book_id: str):
-    deleted = BookService.delete_book(book_id)
+async def delete_book(book_id: str, request: Request):
+    expected_updated_at = _expected_updated_at(request, book_id)
+    deleted = await BookService.delete_book(
+        book_id, expected_updated_at=expected_updated_at
+    )
     if not deleted:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Libro con ID {book_id} no encontrado",
-        )
+        await _missing_or_modified(book_id, expected_updated_at)
     return None
@@ -0,0 +1,203 @@
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries also expire after a TTL.
+    Not thread-safe: meant to be used from the event loop only.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Any], bool]):
+        for key in [k for k, (v, _) in self._data.items() if predicate(v)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CacheBackend:
+    """
+    Async key/value store used by read-through caches. Implementations may be
+    local to the worker or shared between workers (e.g. over the network), so
+    values must be plain JSON-compatible data.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.cache.set(key, value, ttl=ttl)
+
+    async def delete(self, key: str):
+        self.cache.delete(key)
+
+    async def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **self.cache.stats()}
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls: the first caller of a key runs the
+    query in a task and later callers await that same task until it finishes.
+    With `ttl` > 0 results are also kept for that long (a micro-cache).
+
+    Results are shared between callers and must not be mutated. Like
+    TTLCache, meant to be used from the event loop only.
+    """
+
+    def __init__(self, ttl: float = 0.0, maxsize: int = 1000, enabled: bool = True):
+        self.ttl = ttl
+        self.enabled = enabled
+        # bumped by invalidate(), so results of older queries are not cached
+        self.generation = 0
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl) if ttl > 0 else None
+        self.calls: Dict[Hashable, asyncio.Task] = {}
+        # name -> {"executed": n, "coalesced": n, "cached": n}
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, outcome: str):
+        counts = self.counts.setdefault(
+            name, {"executed": 0, "coalesced": 0, "cached": 0}
+        )
+        counts[outcome] += 1
+
+    def _done(self, key: Hashable, generation: int, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if task.cancelled():
+            return
+        # also marks the exception as retrieved if every caller went away
+        failed = task.exception() is not None
+        if self.cache is not None and not failed and generation == self.generation:
+            self.cache.set(key, task.result())
+
+    async def do(self, name: str, key: Hashable, factory: Callable[[], Awaitable]):
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count(name, "cached")
+                return cached
+
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.calls[key] = task
+            task.add_done_callback(functools.partial(self._done, key, self.generation))
+            self._count(name, "executed")
+        else:
+            self._count(name, "coalesced")
+        # a caller that disconnects must not cancel the query for the others
+        return await asyncio.shield(task)
+
+    def coalesce(self, name: str):
+        """
+        Decorator running every call of an async function through do(), keyed
+        by `name` and the repr of its arguments, unless `enabled` is False.
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return await func(*args, **kwargs)
+                key = (name, repr(args), repr(sorted(kwargs.items())))
+                return await self.do(name, key, lambda: func(*args, **kwargs))
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self):
+        """
+        Makes later calls run a new query instead of joining one in flight or
+        reading the micro-cache; call after a write.
+        """
+        self.generation += 1
+        self.calls.clear()
+        if self.cache is not None:
+            self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self.calls),
+            "cached": len(self.cache) if self.cache is not None else 0,
+            "queries": self.counts,
+        }
@@ -1,3 +1,5 @@
+from typing import Literal
+
 # Third Party
 from pydantic_settings import BaseSettings
 
@@ -6,15 +8,90 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str
     DATABASE_NAME: str
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 2000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGODB_CONNECT_TIMEOUT_MS: int = 5000
+    # Comma separated, e.g. "zstd,snappy,zlib" (zstd/snappy need extra packages)
+    MONGODB_COMPRESSORS: str = ""
+    # Used by read-only endpoints (lists, search, stats, export)
+    MONGODB_READ_PREFERENCE: Literal[
+        "primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"
+    ] = "primary"
+    HEALTH_CHECK_TIMEOUT_MS: int = 1000
 
     # Security
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    # Comma separated usernames allowed to use the admin endpoints
+    ADMIN_USERNAMES: str = "admin"
 
     # API
     API_V1_PREFIX: str
 
+    # Performance
+    BOOK_TOTAL_CACHE_TTL: int = 300
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 60
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+    BOOK_IMPORT_BATCH_SIZE: int = 1000
+    BOOK_IMPORT_MAX_ERRORS: int = 1000
+    # Longest NDJSON line or CSV record (quoted newlines included) accepted
+    BOOK_IMPORT_MAX_RECORD_BYTES: int = 1024 * 1024
+    BOOK_CACHE_SIZE: int = 10000
+    BOOK_CACHE_TTL: int = 30
+    BOOK_BATCH_MAX_SIZE: int = 100
+    # Identical concurrent list/search/stats queries share one execution; with
+    # READ_MICROCACHE_MS > 0 results are also reused for that long
+    READ_COALESCING_ENABLED: bool = True
+    READ_MICROCACHE_MS: int = 0
+    READ_MICROCACHE_SIZE: int = 1000
+
+    # Sync
+    BOOK_TOMBSTONE_RETENTION_DAYS: int = 30
+    # The changes feed stops this far behind now, so writes still in flight
+    # (with an earlier updated_at) cannot be skipped by a client's token
+    BOOK_CHANGES_LAG_MS: int = 5000
+
+    # Events
+    # Tail the books change stream (needs a replica set) so every worker's
+    # caches hear about writes from any worker; a longer BOOK_CACHE_TTL is
+    # then safe. Otherwise only this worker's own writes are published.
+    BOOK_CHANGE_STREAM_ENABLED: bool = True
+    # Events buffered per SSE client before it is dropped with a reset
+    BOOK_EVENTS_QUEUE_SIZE: int = 1000
+    BOOK_EVENTS_KEEPALIVE_S: int = 15
+
+    # Stats snapshot
+    # Columnar copy of the catalog behind /books/stats/{percentiles,
+    # histogram,breakdown}, checked for changes every STATS_SNAPSHOT_REFRESH_S
+    STATS_SNAPSHOT_ENABLED: bool = True
+    STATS_SNAPSHOT_REFRESH_S: int = 300
+    STATS_SNAPSHOT_BATCH_SIZE: int = 10000
+
+    # Profiling
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_STORE_SIZE: int = 50
+    SLOW_REQUEST_MS: int = 1000
+
+    # Rate limiting
+    RATE_LIMIT_ENABLED: bool = True
+    # Token bucket per user (per IP when anonymous): refill/s and capacity
+    RATE_LIMIT_PER_SECOND: float = 50
+    RATE_LIMIT_BURST: int = 200
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    # Requests in flight per route class on each worker, beyond which 503
+    CONCURRENCY_LIMIT_AUTH: int = 64
+    CONCURRENCY_LIMIT_SEARCH: int = 32
+    CONCURRENCY_LIMIT_BULK: int = 4
+    CONCURRENCY_LIMIT_READ: int = 512
+    CONCURRENCY_LIMIT_WRITE: int = 128
+    # Open /books/events streams
+    CONCURRENCY_LIMIT_STREAM: int = 256
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,266 @@
+"""
+Declarative index registry.
+
+ensure_indexes() is applied by the app lifespan on every start; creating an
+index that already exists with the same definition is a no-op in MongoDB.
+Indexes the registry used to declare are listed in RETIRED_INDEXES and
+dropped, so existing deployments stop maintaining them on every write.
+Run as a module to apply the registry and report, for every query shape
+issued by the services, whether MongoDB answers it from an index:
+
+    python -m db.indexes --report
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List
+
+# Third Party
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure
+
+# Local
+from config import settings
+from db.mongo import close_mongo_connection, connect_to_mongo, get_database
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "books": [
+        # Spanish text index: case and diacritic insensitive, with stemming
+        IndexModel(
+            [("title", TEXT), ("author", TEXT)],
+            name="books_text",
+            default_language="spanish",
+            weights={"title": 3, "author": 1},
+        ),
+        # Also serves range queries on published_date alone
+        IndexModel(
+            [("published_date", ASCENDING), ("_id", ASCENDING)],
+            name="published_date_id",
+        ),
+        # List filters and sorts (books.query.SHAPES), in equality, sort,
+        # range order and ending in _id for keyset pagination. author_id and
+        # title_id supersede the former single-field author and title indexes
+        # (see RETIRED_INDEXES).
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price_id"),
+        IndexModel([("title", ASCENDING), ("_id", ASCENDING)], name="title_id"),
+        IndexModel([("author", ASCENDING), ("_id", ASCENDING)], name="author_id"),
+        IndexModel(
+            [("author", ASCENDING), ("published_date", ASCENDING), ("_id", ASCENDING)],
+            name="author_published_date_id",
+        ),
+        IndexModel([("genre", ASCENDING), ("_id", ASCENDING)], name="genre_id"),
+        IndexModel(
+            [("genre", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)],
+            name="genre_price_id",
+        ),
+        IndexModel(
+            [("genre", ASCENDING), ("published_date", ASCENDING), ("_id", ASCENDING)],
+            name="genre_published_date_id",
+        ),
+        IndexModel(
+            [("genre", ASCENDING), ("title", ASCENDING), ("_id", ASCENDING)],
+            name="genre_title_id",
+        ),
+        # Changes feed (books.changes)
+        IndexModel(
+            [("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"
+        ),
+    ],
+    "book_tombstones": [
+        IndexModel(
+            [("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"
+        ),
+        IndexModel(
+            [("updated_at", ASCENDING)],
+            name="updated_at_ttl",
+            expireAfterSeconds=settings.BOOK_TOMBSTONE_RETENTION_DAYS * 86400,
+        ),
+    ],
+    "book_stats": [
+        IndexModel(
+            [("year", ASCENDING), ("genre", ASCENDING)],
+            name="year_genre_unique",
+            unique=True,
+        ),
+    ],
+}
+
+# Indexes once declared in INDEXES, dropped when still present
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    # superseded by author_id and title_id
+    "books": ["author", "title"],
+}
+
+# Query shapes issued by the services, as explain commands
+QUERY_SHAPES: Dict[str, Dict[str, Any]] = {
+    "get_user": {"find": "users", "filter": {"username": "admin"}, "limit": 1},
+    "get_book": {"find": "books", "filter": {"_id": ObjectId()}, "limit": 1},
+    "get_books (page)": {
+        "find": "books",
+        "filter": {},
+        "sort": {"_id": ASCENDING},
+        "skip": 100,
+        "limit": 10,
+    },
+    "get_books (cursor)": {
+        "find": "books",
+        "filter": {"_id": {"$gt": ObjectId()}},
+        "sort": {"_id": ASCENDING},
+        "limit": 10,
+    },
+    "get_books (genre, price range)": {
+        "find": "books",
+        "filter": {"genre": "Historia", "price": {"$gte": 10, "$lte": 20}},
+        "sort": {"price": ASCENDING, "_id": ASCENDING},
+        "limit": 10,
+    },
+    "get_books (author, by date)": {
+        "find": "books",
+        "filter": {"author": "George Orwell", "genre": "Distopía"},
+        "sort": {"published_date": DESCENDING, "_id": DESCENDING},
+        "limit": 10,
+    },
+    "get_books (title order, cursor)": {
+        "find": "books",
+        "filter": {
+            "$or": [
+                {"title": {"$gt": "M"}},
+                {"title": "M", "_id": {"$gt": ObjectId()}},
+            ]
+        },
+        "sort": {"title": ASCENDING, "_id": ASCENDING},
+        "limit": 10,
+    },
+    "get_changes": {
+        "find": "books",
+        "filter": {
+            "$and": [
+                {"updated_at": {"$lte": datetime(2030, 1, 1)}},
+                {
+                    "$or": [
+                        {"updated_at": {"$gt": datetime(2020, 1, 1)}},
+                        {
+                            "updated_at": datetime(2020, 1, 1),
+                            "_id": {"$gt": ObjectId()},
+                        },
+                    ]
+                },
+            ]
+        },
+        "sort": {"updated_at": ASCENDING, "_id": ASCENDING},
+        "limit": 101,
+    },
+    "search_books (text)": {
+        "find": "books",
+        "filter": {"$text": {"$search": "hambre"}},
+        "sort": {"score": {"$meta": "textScore"}, "_id": ASCENDING},
+        "limit": 10,
+    },
+    "search_books (regex)": {
+        "find": "books",
+        "filter": {
+            "$or": [
+                {"title": {"$regex": "hambre", "$options": "i"}},
+                {"author": {"$regex": "hambre", "$options": "i"}},
+            ]
+        },
+        "sort": {"_id": ASCENDING},
+        "limit": 10,
+    },
+    "get_average_price_by_year (fallback)": {
+        "aggregate": "books",
+        "pipeline": [
+            {
+                "$match": {
+                    "published_date": {
+                        "$gte": datetime(2010, 1, 1),
+                        "$lt": datetime(2011, 1, 1),
+                    }
+                }
+            },
+            {"$group": {"_id": None, "count": {"$sum": 1}}},
+        ],
+        "cursor": {},
+    },
+    "book_stats by year": {
+        "aggregate": "book_stats",
+        "pipeline": [
+            {"$match": {"year": {"$gte": 2000, "$lte": 2010}, "count": {"$gt": 0}}},
+            {"$group": {"_id": "$year", "count": {"$sum": "$count"}}},
+        ],
+        "cursor": {},
+    },
+}
+
+
+async def ensure_indexes(db: AsyncDatabase):
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as exc:
+                # e.g. duplicated usernames created before the unique index
+                name = index.document["name"]
+                print(f"[indexes] Could not create {collection}.{name}: {exc}")
+
+    for collection, names in RETIRED_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection].drop_index(name)
+                print(f"[indexes] Dropped retired index {collection}.{name}")
+
+
+def _plan_stages(node: Any) -> List[str]:
+    if isinstance(node, dict):
+        stages = [node["stage"]] if isinstance(node.get("stage"), str) else []
+        for key, value in node.items():
+            if key not in ("rejectedPlans", "allPlansExecution"):
+                stages += _plan_stages(value)
+        return stages
+    if isinstance(node, list):
+        return [stage for item in node for stage in _plan_stages(item)]
+    return []
+
+
+async def explain_command(db: AsyncDatabase, command: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Summarizes the winning plan of a find/aggregate/count/distinct command.
+    """
+    explain = await db.command("explain", command, verbosity="queryPlanner")
+    stages = _plan_stages(explain)
+    return {"indexed": "COLLSCAN" not in stages, "stages": list(dict.fromkeys(stages))}
+
+
+async def explain_query_shapes(db: AsyncDatabase) -> List[Dict[str, Any]]:
+    return [
+        {"query": name, **await explain_command(db, command)}
+        for name, command in QUERY_SHAPES.items()
+    ]
+
+
+async def main(args: argparse.Namespace):
+    connect_to_mongo()
+    db = get_database()
+    await ensure_indexes(db)
+    print("[indexes] Registry applied")
+
+    if args.report:
+        for row in await explain_query_shapes(db):
+            status = "index" if row["indexed"] else "COLLSCAN"
+            print(f"{status:9} {row['query']:35} {' > '.join(row['stages'])}")
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply and report MongoDB indexes")
+    parser.add_argument("--report", action="store_true", help="Explain query shapes")
+    asyncio.run(main(parser.parse_args()))
@@ -1,25 +1,24 @@
 from datetime import datetime
 
 # Third Party
-from pymongo import MongoClient, ReturnDocument
+from pymongo import ReturnDocument
 
 # Local
 from auth.services import get_password_hash
-from config import settings
+from db.mongo import get_database
 
 MIGRATION_NAME = "0001_initial_books_and_admin"
 
 
-def migrate_initial_data():
+async def migrate_initial_data():
     """
     Runs the initial data migration only once.
     Safe for Docker, reload, and multiple workers.
     """
 
-    client = MongoClient(settings.MONGODB_URL)
-    db = client[settings.DATABASE_NAME]
+    db = get_database()
 
-    lock = db.migrations.find_one_and_update(
+    lock = await db.migrations.find_one_and_update(
         {"name": MIGRATION_NAME},
         {
             "$setOnInsert": {
@@ -33,7 +32,6 @@ def migrate_initial_data():
 
     if lock is not None:
         print(f"[migration] {MIGRATION_NAME} already executed, skipping")
-        client.close()
         return
 
     print(f"[migration] Running {MIGRATION_NAME}...")
@@ -152,10 +150,10 @@ def migrate_initial_data():
     ]
 
     if books_data:
-        db.books.insert_many(books_data)
+        await db.books.insert_many(books_data)
 
-    if not db.users.find_one({"username": "admin"}):
-        db.users.insert_one(
+    if not await db.users.find_one({"username": "admin"}):
+        await db.users.insert_one(
             {
                 "username": "admin",
                 "hashed_password": get_password_hash("admin123"),
@@ -164,4 +162,3 @@ def migrate_initial_data():
         )
 
     print(f"[migration] {MIGRATION_NAME} executed successfully")
-    client.close()
@@ -1,27 +1,218 @@
 # Third Party
-from pymongo import MongoClient
-from pymongo.database import Database
+import pymongo
+from pymongo import AsyncMongoClient, ReadPreference
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.monitoring import CommandListener, ConnectionPoolListener
 
 # Local
 from config import settings
+from metrics import (
+    MONGO_COMMAND_DURATION,
+    MONGO_COMMAND_FAILURES,
+    MONGO_POOL_WAIT,
+    request_commands,
+    request_db_time,
+)
+
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+# Added by the driver; not accepted inside an explain command
+DRIVER_FIELDS = {"lsid", "txnNumber", "readConcern", "writeConcern"}
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+class PoolMetrics(ConnectionPoolListener):
+    """
+    Connection pool counters fed by pymongo's CMAP events. The callbacks run
+    synchronously inside the driver, so they only update counters.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open = max(0, self.open - 1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+        self._record_wait(event.duration)
+
+    def connection_checked_out(self, event):
+        self.checkouts += 1
+        self.checked_out += 1
+        self.max_checked_out = max(self.max_checked_out, self.checked_out)
+        self._record_wait(event.duration)
+
+    def connection_checked_in(self, event):
+        self.checked_out = max(0, self.checked_out - 1)
+
+    def _record_wait(self, duration: float):
+        MONGO_POOL_WAIT.observe((), duration)
+        self.wait_total += duration
+        self.wait_max = max(self.wait_max, duration)
+
+    def stats(self) -> dict:
+        attempts = self.checkouts + self.checkout_failures
+        return {
+            "max_pool_size": settings.MONGODB_MAX_POOL_SIZE,
+            "min_pool_size": settings.MONGODB_MIN_POOL_SIZE,
+            "open": self.open,
+            "checked_out": self.checked_out,
+            "max_checked_out": self.max_checked_out,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "wait_ms_avg": (
+                round(self.wait_total / attempts * 1000, 3) if attempts else 0.0
+            ),
+            "wait_ms_max": round(self.wait_max * 1000, 3),
+            "clears": self.clears,
+        }
+
+
+class CommandMetrics(CommandListener):
+    """
+    Records the duration of every command per (command, collection) and adds
+    it to the Mongo time of the request that issued it. While a request is
+    being profiled, its commands are also collected in request_commands.
+    """
+
+    def __init__(self):
+        self._started = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore carries the cursor id; database commands carry 1
+            collection = event.command.get("collection", "")
+
+        entry = None
+        commands = request_commands.get()
+        if commands is not None:
+            entry = {"command": event.command_name, "collection": collection}
+            if event.command_name in EXPLAINABLE_COMMANDS:
+                entry["body"] = {
+                    k: v
+                    for k, v in event.command.items()
+                    if not k.startswith("$") and k not in DRIVER_FIELDS
+                }
+            commands.append(entry)
+        self._started[event.request_id] = (collection, entry)
+
+    def succeeded(self, event):
+        self._record(event, ok=True)
+
+    def failed(self, event):
+        labels = self._record(event, ok=False)
+        MONGO_COMMAND_FAILURES.inc(labels)
+
+    def _record(self, event, ok: bool) -> tuple:
+        collection, entry = self._started.pop(event.request_id, ("", None))
+        labels = (event.command_name, collection)
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_DURATION.observe(labels, seconds)
+        db_time = request_db_time.get()
+        if db_time is not None:
+            db_time[0] += seconds
+        if entry is not None:
+            entry["duration_ms"] = round(seconds * 1000, 3)
+            entry["ok"] = ok
+        return labels
+
+
+pool_metrics = PoolMetrics()
+command_metrics = CommandMetrics()
 
 
 class MongoDB:
-    client: MongoClient = None
-    database: Database = None
+    client: AsyncMongoClient = None
+    database: AsyncDatabase = None
+    read_database: AsyncDatabase = None
 
 
 def connect_to_mongo():
-    MongoDB.client = MongoClient(settings.MONGODB_URL)
+    options = {}
+    if settings.MONGODB_COMPRESSORS:
+        options["compressors"] = settings.MONGODB_COMPRESSORS
+    MongoDB.client = AsyncMongoClient(
+        settings.MONGODB_URL,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+        event_listeners=[pool_metrics, command_metrics],
+        **options,
+    )
     MongoDB.database = MongoDB.client[settings.DATABASE_NAME]
+    MongoDB.read_database = MongoDB.client.get_database(
+        settings.DATABASE_NAME,
+        read_preference=READ_PREFERENCES[settings.MONGODB_READ_PREFERENCE],
+    )
     print(f"Connected to MongoDB: {settings.DATABASE_NAME}")
 
 
-def close_mongo_connection():
+async def close_mongo_connection():
     if MongoDB.client:
-        MongoDB.client.close()
+        await MongoDB.client.close()
         print("Connection to MongoDB closed")
 
 
-def get_database() -> Database:
+def get_database() -> AsyncDatabase:
     return MongoDB.database
+
+
+def get_read_database() -> AsyncDatabase:
+    """
+    Database handle with MONGODB_READ_PREFERENCE, for read-only endpoints
+    that can tolerate replication lag.
+    """
+    return MongoDB.read_database
+
+
+async def ping_database(timeout: float = None):
+    """
+    Raises a PyMongoError if MongoDB does not answer a ping within `timeout`
+    seconds (HEALTH_CHECK_TIMEOUT_MS by default).
+    """
+    if timeout is None:
+        timeout = settings.HEALTH_CHECK_TIMEOUT_MS / 1000
+    with pymongo.timeout(timeout):
+        await MongoDB.database.command("ping")
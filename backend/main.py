@@ -3,23 +3,52 @@ from contextlib import asynccontextmanager
 # FastAPI
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 
+# Third Party
+from pymongo.errors import PyMongoError
+
 # Local
+from auth.services import user_cache
 from auth.views import router as auth_router
+from books.events import events_stats, start_book_events, stop_book_events
+from books.services import BookCache, BookReads, BookService
+from books.snapshot import (
+    StatsSnapshot,
+    start_snapshot_refresher,
+    stop_snapshot_refresher,
+)
+from books.stats import ensure_stats
 from books.views import router as books_router
 from config import settings
+from db.indexes import ensure_indexes
 from db.migration import migrate_initial_data
-from db.mongo import connect_to_mongo, close_mongo_connection
+from db.mongo import (
+    connect_to_mongo,
+    close_mongo_connection,
+    get_database,
+    ping_database,
+    pool_metrics,
+)
+from metrics import MetricsMiddleware, registry
+from profiling.services import ProfilingMiddleware
+from profiling.views import router as profiling_router
+from ratelimit import RateLimitMiddleware, RateLimits, rate_limit_stats
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     connect_to_mongo()
-    migrate_initial_data()
+    await migrate_initial_data()
+    await ensure_indexes(get_database())
+    await ensure_stats(get_database())
+    await start_book_events(get_database(), BookService.apply_change)
+    start_snapshot_refresher()
     yield
-    close_mongo_connection()
+    await stop_snapshot_refresher()
+    await stop_book_events()
+    await close_mongo_connection()
 
 
 app = FastAPI(
@@ -29,16 +58,28 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# inside CORS, so that 429/503 responses still carry the CORS headers
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor",
+        "X-Total-Count",
+        "ETag",
+        "Last-Modified",
+        "Retry-After",
+    ],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router, prefix=settings.API_V1_PREFIX)
 app.include_router(books_router, prefix=settings.API_V1_PREFIX)
+app.include_router(profiling_router, prefix=settings.API_V1_PREFIX)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -52,6 +93,94 @@ async def health_check():
     return {"status": "healthy", "service": "book-management-api"}
 
 
+@app.get("/health/ready")
+async def readiness_check():
+    try:
+        await ping_database()
+    except PyMongoError as e:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "unavailable",
+                "service": "book-management-api",
+                "error": type(e).__name__,
+            },
+        )
+    return {"status": "ready", "service": "book-management-api"}
+
+
+@app.get("/db/stats")
+async def database_stats():
+    return {"pool": pool_metrics.stats()}
+
+
+@app.get("/rate-limit/stats")
+async def rate_limit_statistics():
+    return rate_limit_stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "books": BookCache.backend.stats(),
+        "auth": user_cache.stats(),
+        "reads": BookReads.flight.stats(),
+    }
+
+
+@app.get("/events/stats")
+async def book_events_stats():
+    return events_stats()
+
+
+CACHE_SAMPLES = (
+    ("cache_entries", "gauge", "Cached entries", "size"),
+    ("cache_hits_total", "counter", "Cache hits", "hits"),
+    ("cache_misses_total", "counter", "Cache misses", "misses"),
+    ("cache_evictions_total", "counter", "Cache evictions", "evictions"),
+)
+
+
+def _runtime_samples():
+    caches = {"books": BookCache.backend.stats(), "auth": user_cache.stats()}
+    for cache, stats in caches.items():
+        for name, type, help, key in CACHE_SAMPLES:
+            yield name, type, help, {"cache": cache}, stats[key]
+
+    for query, counts in BookReads.flight.stats()["queries"].items():
+        for outcome, count in counts.items():
+            labels = {"query": query, "outcome": outcome}
+            help = "Reads executed, coalesced or cached"
+            yield "read_calls_total", "counter", help, labels, count
+
+    pool = pool_metrics.stats()
+    yield "mongodb_pool_connections", "gauge", "Open connections", {}, pool["open"]
+    yield "mongodb_pool_in_use", "gauge", "Checked out", {}, pool["checked_out"]
+    yield "mongodb_pool_max_size", "gauge", "maxPoolSize", {}, pool["max_pool_size"]
+
+    for route_class, count in RateLimits.in_flight.items():
+        labels = {"route_class": route_class}
+        yield "http_requests_in_flight", "gauge", "Requests in flight", labels, count
+
+    events = events_stats()
+    published, subscribers = events["published"], events["subscribers"]
+    yield "book_events_total", "counter", "Book events broadcast", {}, published
+    yield "book_event_subscribers", "gauge", "Open event streams", {}, subscribers
+
+    if StatsSnapshot.current:
+        info = StatsSnapshot.current.info()
+        age, size = info["age_seconds"], info["memory_bytes"]
+        yield "stats_snapshot_age_seconds", "gauge", "Since last check", {}, age
+        yield "stats_snapshot_bytes", "gauge", "Snapshot memory", {}, size
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(_runtime_samples()), media_type="text/plain; version=0.0.4"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,234 @@
+"""
+In-process metrics rendered in the Prometheus text format (version 0.0.4).
+
+Counters and histograms are plain dicts keyed by label values; they are
+updated from the event loop (and from pymongo listeners, which run in the
+same thread), so no locking is needed.
+"""
+
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# (name, type, help, labels, value) for values read at scrape time
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+# Mongo time spent by the current request, filled by the command listener
+request_db_time: ContextVar[Optional[List[float]]] = ContextVar(
+    "request_db_time", default=None
+)
+
+# Mongo commands issued by the current request, only set while profiling
+request_commands: ContextVar[Optional[List[dict]]] = ContextVar(
+    "request_commands", default=None
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        for values, total in self.values.items():
+            labels = _format_labels(dict(zip(self.labels, values)))
+            yield f"{self.name}{labels} {_format_value(total)}"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        bounds = [*self.buckets, float("inf")]
+        for values, (counts, total, count) in self.series.items():
+            labels = dict(zip(self.labels, values))
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {total!r}"
+            yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[object] = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, samples: Iterable[Sample] = ()) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+
+        # a metric's samples must be contiguous in the output
+        families: Dict[str, List[str]] = {}
+        for name, type, help, labels, value in samples:
+            if name not in families:
+                families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+            families[name].append(
+                f"{name}{_format_labels(labels)} {_format_value(value)}"
+            )
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the last byte of the response",
+    ("method", "route"),
+)
+HTTP_REQUEST_DB_DURATION = registry.histogram(
+    "http_request_db_duration_seconds",
+    "MongoDB command time spent within a request",
+    ("method", "route"),
+)
+AUTH_DURATION = registry.histogram(
+    "auth_duration_seconds",
+    "Time to resolve the current user from a bearer token",
+    ("source",),
+)
+MONGO_COMMAND_DURATION = registry.histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command round-trip time",
+    ("command", "collection"),
+)
+MONGO_COMMAND_FAILURES = registry.counter(
+    "mongodb_command_failures_total",
+    "MongoDB commands that failed",
+    ("command", "collection"),
+)
+MONGO_POOL_WAIT = registry.histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+)
+RATE_LIMIT_REJECTIONS = registry.counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter or a concurrency limit",
+    ("route_class", "reason"),
+)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording count, latency and Mongo time per route
+    template (e.g. /api/v1/books/{book_id}), so ids never become labels.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        db_time = [0.0]
+        token = request_db_time.set(db_time)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_db_time.reset(token)
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route else "unmatched")
+            HTTP_REQUESTS.inc((*labels, str(status_code)))
+            HTTP_REQUEST_DURATION.observe(labels, elapsed)
+            HTTP_REQUEST_DB_DURATION.observe(labels, db_time[0])
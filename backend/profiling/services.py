@@ -0,0 +1,229 @@
+"""
+Opt-in request profiling.
+
+A fraction of requests (PROFILE_SAMPLE_RATE), plus any request an admin sends
+with an `X-Profile` header, runs under cProfile. Each profile keeps the top
+functions by cumulative time and the Mongo commands the request issued, with
+an explain summary of its queries; the last PROFILE_STORE_SIZE profiles are
+served by /admin/profiles. Requests slower than SLOW_REQUEST_MS are logged
+whether or not they were profiled.
+
+cProfile sees everything the event loop runs while it is enabled, so other
+requests in flight can show up in a profile; only one request is profiled
+at a time. Streaming responses (the event stream and the export) last as
+long as the client keeps reading, so they are neither profiled nor logged
+as slow.
+"""
+
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# FastAPI
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+# Third Party
+from bson import json_util
+from pymongo.errors import PyMongoError
+
+# Local
+from auth.services import get_current_user, is_admin
+from config import settings
+from db.indexes import explain_command
+from db.mongo import get_database
+from metrics import request_commands, request_db_time
+
+
+PROFILE_HEADER = b"x-profile"
+# GET paths under API_V1_PREFIX whose response lasts as long as the client
+STREAMING_PATHS = ("/books/events", "/books/export")
+CALL_TREE_LIMIT = 40
+
+logger = logging.getLogger("profiling")
+
+
+class Profiles:
+    store: deque = deque(maxlen=settings.PROFILE_STORE_SIZE)
+    active: bool = False
+    # explain tasks still running, kept so they are not garbage collected
+    tasks: set = set()
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+async def _requested_by_admin(scope) -> bool:
+    if _header(scope, PROFILE_HEADER) is None:
+        return False
+    authorization = (_header(scope, b"authorization") or b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        credentials = HTTPAuthorizationCredentials(scheme=scheme, credentials=token)
+        user = await get_current_user(credentials)
+    except HTTPException:
+        return False
+    return is_admin(user)
+
+
+def _call_tree(profiler: cProfile.Profile) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(CALL_TREE_LIMIT)
+    return stream.getvalue()
+
+
+async def _explain(queries: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+    db = get_database()
+    for entry, body in queries:
+        try:
+            entry["explain"] = await explain_command(db, body)
+        except PyMongoError as e:
+            entry["explain"] = {"error": str(e)}
+
+
+def _streaming(scope) -> bool:
+    path = scope["path"]
+    if scope["method"] != "GET" or not path.startswith(settings.API_V1_PREFIX):
+        return False
+    return path[len(settings.API_V1_PREFIX) :].startswith(STREAMING_PATHS)
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    return route.path if route else "unmatched"
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _streaming(scope):
+            await self.app(scope, receive, send)
+            return
+
+        reason = None
+        if not Profiles.active:
+            rate = settings.PROFILE_SAMPLE_RATE
+            if rate and random.random() < rate:
+                reason = "sampled"
+            elif await _requested_by_admin(scope):
+                reason = "header"
+
+        if reason is None:
+            start = time.perf_counter()
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if elapsed_ms >= settings.SLOW_REQUEST_MS:
+                    db_time = request_db_time.get()
+                    db_ms = db_time[0] * 1000 if db_time else None
+                    self._log_slow(scope, elapsed_ms, db_ms)
+            return
+
+        await self._profile(scope, receive, send, reason)
+
+    async def _profile(self, scope, receive, send, reason: str):
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        commands = []
+        token = request_commands.set(commands)
+        profiler = cProfile.Profile()
+        Profiles.active = True
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            Profiles.active = False
+            request_commands.reset(token)
+
+            queries = []
+            for entry in commands:
+                body = entry.pop("body", None)
+                if body is not None:
+                    entry["query"] = json_util.dumps(body)
+                    queries.append((entry, body))
+
+            profile = {
+                "id": uuid.uuid4().hex,
+                "reason": reason,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": _route(scope),
+                "status": status_code,
+                "started_at": started_at,
+                "duration_ms": round(elapsed_ms, 3),
+                "db_ms": round(sum(c.get("duration_ms", 0) for c in commands), 3),
+                "commands": commands,
+                "call_tree": _call_tree(profiler),
+            }
+            Profiles.store.append(profile)
+            if elapsed_ms >= settings.SLOW_REQUEST_MS:
+                self._log_slow(scope, elapsed_ms, profile["db_ms"], profile["id"])
+
+            if queries:
+                # explain after the response, without holding up the request
+                task = asyncio.create_task(_explain(queries))
+                Profiles.tasks.add(task)
+                task.add_done_callback(Profiles.tasks.discard)
+
+    @staticmethod
+    def _log_slow(
+        scope,
+        elapsed_ms: float,
+        db_ms: Optional[float],
+        profile_id: Optional[str] = None,
+    ):
+        logger.warning(
+            "Slow request %s %s (%s): %.1f ms, db %s ms, profile %s",
+            scope["method"],
+            scope["path"],
+            _route(scope),
+            elapsed_ms,
+            "?" if db_ms is None else f"{db_ms:.1f}",
+            profile_id or "-",
+        )
+
+
+def get_profiles() -> List[Dict[str, Any]]:
+    """
+    Stored profiles, newest first, without commands or call tree.
+    """
+    hidden = ("commands", "call_tree")
+    return [
+        {k: v for k, v in profile.items() if k not in hidden}
+        for profile in reversed(Profiles.store)
+    ]
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    for profile in Profiles.store:
+        if profile["id"] == profile_id:
+            return profile
+    return None
@@ -0,0 +1,25 @@
+# FastAPI
+from fastapi import APIRouter, HTTPException, status, Depends
+
+# Local
+from auth.services import get_admin_user
+from profiling.services import get_profile, get_profiles
+
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"])
+
+
+@router.get("/", dependencies=[Depends(get_admin_user)])
+async def list_profiles():
+    return get_profiles()
+
+
+@router.get("/{profile_id}", dependencies=[Depends(get_admin_user)])
+async def read_profile(profile_id: str):
+    profile = get_profile(profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Perfil con ID {profile_id} no encontrado",
+        )
+    return profile
@@ -0,0 +1,230 @@
+"""
+Admission control: per-client token buckets and per-route-class limits on
+requests in flight.
+
+Each limited request takes `cost` tokens from the bucket of its client (the
+`sub` of a valid bearer token, otherwise the client address); when the bucket
+is empty the request is answered 429 with Retry-After. Independently, every
+route class admits a bounded number of requests in flight on this worker and
+sheds the rest with 503, so a burst of expensive requests (Argon2 logins,
+regex searches, exports) is refused at once instead of queueing until every
+request is slow.
+
+Buckets live in a RateLimitBackend, in-process by default; a backend shared
+between workers only has to implement consume(). In-flight counts are always
+per worker: they protect this worker's event loop and connection pool.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# FastAPI
+from fastapi.responses import JSONResponse
+
+# Third Party
+from jose import JWTError, jwt
+
+# Local
+from config import settings
+from metrics import RATE_LIMIT_REJECTIONS
+
+
+# (method or None for any, path prefix under API_V1_PREFIX, route class,
+# cost in tokens); the first matching rule applies and paths outside the API
+# (health, metrics, docs) are never limited
+RULES = [
+    ("POST", "/auth/login", "auth", 10),
+    ("POST", "/auth/register", "auth", 10),
+    ("GET", "/auth/me", "read", 1),
+    ("GET", "/books/search", "search", 5),
+    ("GET", "/books/export", "bulk", 20),
+    ("POST", "/books/import", "bulk", 20),
+    ("POST", "/books/batch-get", "read", 5),
+    ("POST", "/books/batch-", "write", 10),
+    ("GET", "/books/stats/", "read", 2),
+    ("GET", "/books/changes", "read", 5),
+    ("GET", "/books/events", "stream", 1),
+    ("GET", "/books", "read", 1),
+    (None, "/books", "write", 2),
+]
+
+CONCURRENCY_LIMITS = {
+    "auth": settings.CONCURRENCY_LIMIT_AUTH,
+    "search": settings.CONCURRENCY_LIMIT_SEARCH,
+    "bulk": settings.CONCURRENCY_LIMIT_BULK,
+    "read": settings.CONCURRENCY_LIMIT_READ,
+    "write": settings.CONCURRENCY_LIMIT_WRITE,
+    "stream": settings.CONCURRENCY_LIMIT_STREAM,
+}
+
+
+class RateLimitBackend:
+    """
+    Token bucket store keyed by client. Implementations may be local to the
+    worker or shared between workers; consume() must be atomic per key.
+    """
+
+    async def consume(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """
+        Takes `cost` tokens from the bucket of `key`, which refills at `rate`
+        tokens/s up to `burst`. Returns 0 on success, otherwise the seconds
+        until enough tokens will be available (nothing is taken).
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in an LRU dict of at most `max_keys` clients. An evicted client
+    starts again with a full bucket, which is what an idle one would have.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.evictions = 0
+        # key -> [tokens, monotonic time of the last update]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def consume(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        tokens = burst if bucket is None else bucket[0] + (now - bucket[1]) * rate
+        tokens = min(tokens, burst)
+        cost = min(cost, burst)
+
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+
+        self._buckets[key] = [tokens, now]
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "keys": len(self._buckets),
+            "max_keys": self.max_keys,
+            "evictions": self.evictions,
+        }
+
+
+class RateLimits:
+    backend: RateLimitBackend = MemoryRateLimitBackend(settings.RATE_LIMIT_MAX_KEYS)
+    in_flight: Dict[str, int] = {route_class: 0 for route_class in CONCURRENCY_LIMITS}
+
+
+def _match(scope) -> Optional[Tuple[str, int]]:
+    method, path = scope["method"], scope["path"]
+    if not path.startswith(settings.API_V1_PREFIX):
+        return None
+    path = path[len(settings.API_V1_PREFIX) :]
+    for rule_method, prefix, route_class, cost in RULES:
+        if (rule_method is None or rule_method == method) and path.startswith(prefix):
+            return route_class, cost
+    return None
+
+
+def _client_key(scope) -> str:
+    authorization = b""
+    for key, value in scope["headers"]:
+        if key == b"authorization":
+            authorization = value
+            break
+
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        # only a verified token names a user, or anyone could spend another
+        # user's tokens; expired or forged ones fall back to the address
+        try:
+            payload = jwt.decode(
+                token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+            )
+        except JWTError:
+            payload = {}
+        if payload.get("sub"):
+            return f"user:{payload['sub']}"
+
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+async def _reject(scope, receive, send, status_code: int, detail: str, wait: float):
+    response = JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(wait)))},
+    )
+    await response(scope, receive, send)
+
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        rule = _match(scope)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        route_class, cost = rule
+        # counted before any await, so concurrent requests see each other
+        RateLimits.in_flight[route_class] += 1
+        try:
+            if RateLimits.in_flight[route_class] > CONCURRENCY_LIMITS[route_class]:
+                RATE_LIMIT_REJECTIONS.inc((route_class, "concurrency"))
+                await _reject(
+                    scope,
+                    receive,
+                    send,
+                    503,
+                    "Servicio saturado, inténtelo más tarde",
+                    1,
+                )
+                return
+
+            if settings.RATE_LIMIT_PER_SECOND > 0:
+                wait = await RateLimits.backend.consume(
+                    _client_key(scope),
+                    cost,
+                    settings.RATE_LIMIT_PER_SECOND,
+                    settings.RATE_LIMIT_BURST,
+                )
+                if wait:
+                    RATE_LIMIT_REJECTIONS.inc((route_class, "rate"))
+                    await _reject(
+                        scope,
+                        receive,
+                        send,
+                        429,
+                        "Demasiadas solicitudes, inténtelo más tarde",
+                        wait,
+                    )
+                    return
+
+            await self.app(scope, receive, send)
+        finally:
+            RateLimits.in_flight[route_class] -= 1
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    return {
+        "buckets": RateLimits.backend.stats(),
+        "in_flight": dict(RateLimits.in_flight),
+        "limits": CONCURRENCY_LIMITS,
+    }
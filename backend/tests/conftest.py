@@ -0,0 +1,10 @@
+import os
+
+
+# config.Settings has no defaults for these; the tests never reach MongoDB
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "books_test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("API_V1_PREFIX", "/api/v1")
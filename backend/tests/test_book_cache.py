@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime
+
+# Third Party
+from bson import ObjectId
+
+# Local
+from books import services
+from books.services import BookCache, BookService
+
+
+class SlowCollection:
+    """
+    find_one returns the document it was given once `release` is set, like
+    a read that started before a write and returns after its change event.
+    """
+
+    def __init__(self, book):
+        self.book = book
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def find_one(self, query):
+        self.started.set()
+        await self.release.wait()
+        return dict(self.book)
+
+
+class SlowDatabase:
+    def __init__(self, book):
+        self.books = SlowCollection(book)
+
+
+def make_book():
+    now = datetime(2020, 1, 1)
+    return {
+        "_id": ObjectId(),
+        "title": "Rayuela",
+        "author": "Julio Cortázar",
+        "published_date": now,
+        "genre": "Novela",
+        "price": 20.0,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+async def test_fetch_does_not_fill_a_key_changed_meanwhile(monkeypatch):
+    book = make_book()
+    key = str(book["_id"])
+    db = SlowDatabase(book)
+    monkeypatch.setattr(services, "get_database", lambda: db)
+
+    fetch = asyncio.create_task(BookService.get_book(key))
+    await db.books.started.wait()
+    await BookService.apply_change({"op": "update", "_id": key})
+    db.books.release.set()
+
+    assert (await fetch).title == "Rayuela"
+    assert await BookCache.backend.get(key) is None
+    assert key not in BookCache.fetches and key not in BookCache.written
+
+
+async def test_fetch_fills_the_cache(monkeypatch):
+    book = make_book()
+    key = str(book["_id"])
+    db = SlowDatabase(book)
+    db.books.release.set()
+    monkeypatch.setattr(services, "get_database", lambda: db)
+
+    await BookService.get_book(key)
+
+    assert (await BookCache.backend.get(key))["title"] == "Rayuela"
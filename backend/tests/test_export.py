@@ -0,0 +1,78 @@
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Third Party
+import pytest
+from bson import ObjectId
+
+# Local
+from books import exporter
+
+
+ROWS = 1_000_000
+# the whole export is over 150 MB; one batch of 1000 rows is about 200 KB
+MAX_PEAK_BYTES = 16 * 1024 * 1024
+
+
+def synthetic_rows(count: int):
+    published = datetime(2000, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "title": f"Libro {i}",
+            "author": f"Autor {i}",
+            "published_date": published + timedelta(days=i),
+            "genre": "Novela",
+            "price": 10 + i % 50,
+            "created_at": published,
+            "updated_at": published,
+        }
+        for i in range(count)
+    ]
+
+
+class SyntheticCursor:
+    """
+    Async cursor yielding `count` rows by cycling over a small pool, so the
+    only memory that grows with the export is the exporter's own.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self.pool = synthetic_rows(1000)
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def batch_size(self, *args, **kwargs):
+        return self
+
+    async def __aiter__(self):
+        for i in range(self.count):
+            yield self.pool[i % len(self.pool)]
+
+
+class SyntheticCollection:
+    def find(self, query, projection):
+        return SyntheticCursor(ROWS)
+
+
+class SyntheticDatabase:
+    books = SyntheticCollection()
+
+
+@pytest.mark.parametrize("format, header_rows", [("ndjson", 0), ("csv", 1)])
+async def test_export_memory_is_bounded(monkeypatch, format, header_rows):
+    monkeypatch.setattr(exporter, "get_read_database", SyntheticDatabase)
+
+    lines = 0
+    tracemalloc.start()
+    try:
+        async for chunk in exporter.export_books(format, batch_size=1000):
+            lines += chunk.count(b"\n")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert lines == ROWS + header_rows
+    assert peak < MAX_PEAK_BYTES
@@ -0,0 +1,65 @@
+import base64
+from datetime import datetime
+
+# Third Party
+import pytest
+from bson import ObjectId, json_util
+from fastapi import HTTPException
+
+# Local
+from books.changes import CHANGES_SORT
+from books.pagination import DEFAULT_SORT, decode_cursor, encode_cursor
+from books.views import _decode_cursor
+
+
+PRICE_SORT = [("price", 1), ("_id", 1)]
+
+
+def token(values) -> str:
+    raw = json_util.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize(
+    "sort, book",
+    [
+        (DEFAULT_SORT, {"_id": str(ObjectId())}),
+        (PRICE_SORT, {"_id": str(ObjectId()), "price": 12.5}),
+        (PRICE_SORT, {"_id": str(ObjectId()), "price": 12}),
+        (CHANGES_SORT, {"_id": str(ObjectId()), "updated_at": datetime(2024, 5, 1)}),
+    ],
+)
+def test_round_trip(sort, book):
+    after = decode_cursor(encode_cursor(book, sort), sort)
+    assert after == {**book, "_id": ObjectId(book["_id"])}
+
+
+@pytest.mark.parametrize(
+    "sort, cursor",
+    [
+        # operator documents instead of values
+        (DEFAULT_SORT, token({"_id": {"$ne": None}})),
+        (PRICE_SORT, token({"price": {"$ne": None}, "_id": ObjectId()})),
+        (PRICE_SORT, token({"price": {"$regex": "."}, "_id": ObjectId()})),
+        (CHANGES_SORT, token({"updated_at": {"$gt": 0}, "_id": ObjectId()})),
+        # wrong types
+        (DEFAULT_SORT, token({"_id": "not-an-object-id"})),
+        (PRICE_SORT, token({"price": "12", "_id": ObjectId()})),
+        (PRICE_SORT, token({"price": True, "_id": ObjectId()})),
+        (CHANGES_SORT, token({"updated_at": "x", "_id": "y"})),
+        # wrong keys
+        (DEFAULT_SORT, token({"id": ObjectId()})),
+        (PRICE_SORT, token({"_id": ObjectId()})),
+        (DEFAULT_SORT, token({"_id": ObjectId(), "price": 1})),
+        (DEFAULT_SORT, token([ObjectId()])),
+        # not a token
+        (DEFAULT_SORT, "%%%"),
+        (DEFAULT_SORT, base64.urlsafe_b64encode(b"{not json").decode()),
+    ],
+)
+def test_tampered_cursor_is_rejected(sort, cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, sort)
+    with pytest.raises(HTTPException) as exc:
+        _decode_cursor(cursor, sort)
+    assert exc.value.status_code == 400
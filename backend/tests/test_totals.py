@@ -0,0 +1,19 @@
+# Third Party
+import pytest
+
+# Local
+from books.services import BookService
+from books.totals import get_cached_total, set_cached_total
+
+
+@pytest.mark.parametrize("op", ["insert", "delete", "reset"])
+async def test_change_events_drop_the_cached_total(op):
+    set_cached_total(10)
+    await BookService.apply_change({"op": op, "_id": "0" * 24})
+    assert get_cached_total() is None
+
+
+async def test_updates_keep_the_cached_total():
+    set_cached_total(10)
+    await BookService.apply_change({"op": "update", "_id": "0" * 24})
+    assert get_cached_total() == 10